@@ -0,0 +1,57 @@
+"""
+In-process fan-out to websocket subscribers.
+
+Each subscriber gets its own bounded queue. Publishing never blocks: when a
+subscriber has fallen so far behind that its queue is full, its backlog is
+dropped and replaced with a resync message carrying the full current state.
+"""
+import asyncio
+
+
+class Broadcaster:
+    def __init__(self, queue_size=16):
+        self.queue_size = queue_size
+        self.subscribers = set()
+
+    def subscribe(self, snapshot=None):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if snapshot is not None:
+            queue.put_nowait(snapshot)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, message, resync=None):
+        for queue in self.subscribers:
+            if queue.full():
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(resync if resync is not None else message)
+            else:
+                queue.put_nowait(message)
+
+
+async def pump(websocket, queue):
+    """
+    Forward queued messages to websocket until the client goes away.
+
+    The socket is read concurrently so a disconnect is noticed straight away
+    instead of on the next send, which may be minutes later.
+    """
+    async def send():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def receive():
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(send()), asyncio.ensure_future(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
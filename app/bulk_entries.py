@@ -0,0 +1,209 @@
+"""
+Bulk import and export of a user's entries.
+
+Imports are parsed line by line from the request body, as NDJSON or as CSV
+with a header row, and validated against ``Player``. Each row may carry a
+``date`` (YYYY-MM-DD) or an ISO ``created_at``; rows without one are dated
+now and rows dated after today (UTC) are rejected. Valid rows are written in
+batches of BATCH_SIZE with one unordered bulk_write of (email, day) upserts,
+so the one-entry-per-day rule holds and a later row for the same day
+overwrites an earlier one, exactly like repeated ``POST /entries`` calls. The user's leaderboard rows and rollup are rebuilt
+from their entries and their cached responses invalidated once at the end,
+because an import may land anywhere in their history and deltas read before
+the write could race a concurrent ``POST /entries`` for the same day. That also
+happens when the upload fails partway, as long as some batch was written.
+
+Exports stream the user's entries straight from a cursor, so memory use does
+not depend on the length of the history.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from . import leaderboard, rollups
+from .days import day_key, day_start, utc_now
+from .response_cache import LEADERBOARD, user_namespace
+from .routers.temp import Player
+
+BATCH_SIZE = 500
+MAX_LINE_BYTES = 64 * 1024
+MAX_ERRORS = 100
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_ROWS = 200
+EXPORT_FIELDS = ('_id', 'day', 'created_at', 'position', 'goals', 'assists')
+
+CSV_TYPES = ('text/csv',)
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def import_format(content_type):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in CSV_TYPES:
+        return 'csv'
+    if media_type in NDJSON_TYPES:
+        return 'ndjson'
+    raise HTTPException(status_code=415, detail="Send entries as text/csv or application/x-ndjson")
+
+
+async def iter_lines(chunks):
+    """Split an async stream of byte chunks into decoded lines, skipping blank ones."""
+    buffer = b''
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        if len(buffer) > MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Lines must be under {MAX_LINE_BYTES} bytes")
+        for line in lines:
+            if line.strip():
+                yield line.decode('utf-8-sig').rstrip('\r')
+    if buffer.strip():
+        yield buffer.decode('utf-8-sig').rstrip('\r')
+
+
+async def iter_records(chunks, fmt):
+    """Yield (line number, dict) pairs; a row that cannot be parsed yields its error string instead."""
+    header = None
+    number = 0
+    async for line in iter_lines(chunks):
+        number += 1
+        if fmt == 'ndjson':
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, f"invalid JSON: {e}"
+                continue
+            yield number, record if isinstance(record, dict) else "expected a JSON object"
+            continue
+        row = next(csv.reader([line]))
+        if header is None:
+            header = [field.strip() for field in row]
+            continue
+        if len(row) != len(header):
+            yield number, f"expected {len(header)} columns, found {len(row)}"
+            continue
+        yield number, dict(zip(header, row))
+
+
+def entry_time(record, now):
+    if record.get('created_at'):
+        created_at = datetime.fromisoformat(str(record['created_at']).replace('Z', '+00:00'))
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    elif record.get('date'):
+        created_at = datetime.strptime(record['date'], '%Y-%m-%d')
+    else:
+        return now
+    # A future day would sit inside every leaderboard window until it arrives
+    if day_start(created_at) > day_start(now):
+        raise ValueError(f"{day_key(created_at)} is in the future")
+    return created_at
+
+
+def to_entry(record, now):
+    """Validate one import row and return the entry fields to store."""
+    entry = Player(**{field: record.get(field) for field in ('position', 'goals', 'assists')}).model_dump()
+    entry['created_at'] = entry_time(record, now)
+    return entry
+
+
+async def write_batch(db, email, batch):
+    """
+    Upsert one batch of entries, keyed by day.
+
+    Returns (inserted, updated, errors).
+    """
+    by_day = {}
+    for entry in batch:
+        by_day[day_key(entry['created_at'])] = entry
+    days = list(by_day)
+    requests = [
+        UpdateOne({'email': email, 'day': day}, {'$set': by_day[day], '$setOnInsert': {'_id': ObjectId()}},
+                  upsert=True)
+        for day in days
+    ]
+    errors = []
+    try:
+        result = (await db["entries"].bulk_write(requests, ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        for error in e.details['writeErrors']:
+            errors.append(f"{days[error['index']]}: {error['errmsg']}")
+    return result['nUpserted'], result['nMatched'], errors
+
+
+async def import_entries(db, cache, email, chunks, fmt):
+    now = utc_now()
+    result = {'inserted': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+
+    def reject(message):
+        result['rejected'] += 1
+        if len(result['errors']) < MAX_ERRORS:
+            result['errors'].append(message)
+
+    async def flush(batch):
+        inserted, updated, errors = await write_batch(db, email, batch)
+        result['inserted'] += inserted
+        result['updated'] += updated
+        for error in errors:
+            reject(error)
+
+    batch = []
+    try:
+        async for number, record in iter_records(chunks, fmt):
+            if isinstance(record, str):
+                reject(f"line {number}: {record}")
+                continue
+            try:
+                batch.append(to_entry(record, now))
+            except (ValidationError, ValueError, TypeError) as e:
+                reject(f"line {number}: {e}".replace('\n', ' '))
+                continue
+            if len(batch) >= BATCH_SIZE:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+    finally:
+        # Also after a failed upload, so batches already written reach the views and the cache
+        if result['inserted'] or result['updated']:
+            await leaderboard.rebuild_user(db, email)
+            await rollups.repair(db, [email])
+            await cache.invalidate(user_namespace(email), LEADERBOARD)
+    return result
+
+
+def _export_row(entry):
+    row = {field: entry.get(field) for field in EXPORT_FIELDS}
+    row['_id'] = str(row['_id'])
+    row['created_at'] = row['created_at'].isoformat()
+    return row
+
+
+async def export_entries(db, email, query, fmt):
+    """Yield the user's entries, oldest first, as NDJSON lines or CSV rows, EXPORT_CHUNK_ROWS at a time."""
+    cursor = db["entries"].find({'email': email, **query}, {field: 1 for field in EXPORT_FIELDS}) \
+        .sort('created_at', 1).batch_size(EXPORT_BATCH_SIZE)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writeheader()
+    rows = 0
+    async for entry in cursor:
+        if fmt == 'csv':
+            writer.writerow(_export_row(entry))
+        else:
+            buffer.write(json.dumps(_export_row(entry)) + '\n')
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,21 @@
+"""
+UTC day helpers.
+
+Entries are logged once per user per UTC day. Timestamps are kept as naive
+UTC datetimes, which is what pymongo stores and hands back, so values
+written and values read compare directly.
+"""
+from datetime import datetime, timezone
+
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def day_start(dt):
+    return datetime(dt.year, dt.month, dt.day)
+
+
+def day_key(dt):
+    """The per-user-per-day key stored on entries, e.g. '2024-05-03'."""
+    return dt.strftime('%Y-%m-%d')
@@ -0,0 +1,124 @@
+"""
+Friendship adjacency store.
+
+Every friendship is stored as two directed rows in ``friend_edges``
+({user_email, friend_email, created_at}), with a unique index on
+(user_email, friend_email). Listing someone's friends is then a single index
+range and checking a friendship is a single index probe. A repeated accept
+cannot create duplicate rows. Friend sets used for authorization checks are
+cached in-process for FRIEND_SET_TTL seconds.
+
+Friendships recorded before this store existed are copied over with:
+
+    python -m app.friend_graph backfill
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from cachetools import TTLCache
+from pymongo import IndexModel, ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+FRIEND_SET_TTL = float(os.getenv('FRIEND_SET_TTL', 60))
+FRIEND_SET_CACHE_SIZE = int(os.getenv('FRIEND_SET_CACHE_SIZE', 10000))
+BATCH_SIZE = 500
+DUPLICATE_KEY = 11000
+
+indexes = {
+    "friend_edges": [
+        IndexModel([('user_email', ASCENDING), ('friend_email', ASCENDING)], unique=True),
+    ],
+}
+query_shapes = [
+    ("friend_edges", {'user_email': ''}, [('friend_email', 1)]),
+    ("friend_edges", {'user_email': '', 'friend_email': ''}, None),
+]
+
+
+def _edge_upserts(user1_email, user2_email, created_at):
+    return [
+        UpdateOne({'user_email': a, 'friend_email': b}, {'$setOnInsert': {'created_at': created_at}}, upsert=True)
+        for a, b in ((user1_email, user2_email), (user2_email, user1_email))
+    ]
+
+
+async def _write_edges(db, operations):
+    try:
+        await db["friend_edges"].bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        # Concurrent upserts of the same edge can race to insert; the edge exists either way.
+        if any(error['code'] != DUPLICATE_KEY for error in exc.details['writeErrors']):
+            raise
+
+
+class FriendSets:
+    def __init__(self, ttl=FRIEND_SET_TTL, maxsize=FRIEND_SET_CACHE_SIZE):
+        self.sets = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, db, email):
+        friends = self.sets.get(email)
+        if friends is None:
+            friends = frozenset([
+                edge['friend_email']
+                async for edge in db["friend_edges"].find({'user_email': email}, {'_id': 0, 'friend_email': 1})
+            ])
+            self.sets[email] = friends
+        return friends
+
+    async def are_friends(self, db, email, other_email):
+        return other_email in await self.get(db, email)
+
+    def invalidate(self, *emails):
+        for email in emails:
+            self.sets.pop(email, None)
+
+
+friend_sets = FriendSets()
+
+
+async def add_friendship(db, user1_email, user2_email, created_at=None):
+    await _write_edges(db, _edge_upserts(user1_email, user2_email, created_at or datetime.utcnow()))
+    friend_sets.invalidate(user1_email, user2_email)
+
+
+async def backfill(db):
+    """
+    Create edges for every row in ``friendships`` and every accepted friend
+    request, in batches. Existing edges are left alone, so this is safe to
+    re-run.
+    """
+    sources = [
+        (db["friendships"].find({}), 'user1_email', 'user2_email'),
+        (db["friend_requests"].find({'status': 'accepted'}), 'sender_email', 'recipient_email'),
+    ]
+    friendships = 0
+    for cursor, first, second in sources:
+        while True:
+            batch = await cursor.to_list(length=BATCH_SIZE)
+            if not batch:
+                break
+            operations = []
+            for row in batch:
+                created_at = row.get('created_at') or row.get('updated_at') or datetime.utcnow()
+                operations.extend(_edge_upserts(row[first], row[second], created_at))
+            await _write_edges(db, operations)
+            friendships += len(batch)
+    return friendships
+
+
+async def _main():
+    from .db import DB_NAME, create_client
+
+    client = create_client()
+    try:
+        print(f"backfilled edges for {await backfill(client[DB_NAME])} friendships")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ['backfill']:
+        sys.exit("usage: python -m app.friend_graph backfill")
+    asyncio.run(_main())
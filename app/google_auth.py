@@ -0,0 +1,77 @@
+"""
+Google sign-in.
+
+The access token from the frontend is checked with a single call to Google's
+userinfo endpoint, which both validates the token and returns the profile we
+store. Identities are cached by token digest so repeated sign-ins with the
+same token skip Google entirely, and concurrent sign-ins with one token share
+a single upstream call. Userinfo does not report how long the token has
+left, so entries live for GOOGLE_IDENTITY_TTL seconds, well inside the hour
+a Google access token is valid for.
+"""
+import asyncio
+import hashlib
+import os
+
+import httpx
+from cachetools import TTLCache
+from fastapi import HTTPException
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+GOOGLE_USERINFO_URL = os.getenv('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v3/userinfo')
+IDENTITY_TTL = int(os.getenv('GOOGLE_IDENTITY_TTL', 300))
+CACHE_SIZE = int(os.getenv('GOOGLE_IDENTITY_CACHE_SIZE', 10000))
+
+indexes = {
+    "users": [IndexModel('email', unique=True)],
+}
+query_shapes = [
+    ("users", {'email': ''}, None),
+    ("users", {'email': {'$in': ['']}}, None),
+]
+
+_identities = TTLCache(maxsize=CACHE_SIZE, ttl=IDENTITY_TTL)
+_inflight = {}
+
+
+async def _fetch_identity(http, access_token):
+    try:
+        response = await http.get(GOOGLE_USERINFO_URL, headers={'Authorization': f'Bearer {access_token}'})
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail='Google sign-in is unavailable')
+    if response.status_code != 200:
+        raise HTTPException(status_code=401, detail='Invalid token')
+    user_info = response.json()
+    if not user_info.get('email'):
+        raise HTTPException(status_code=401, detail='Invalid token')
+    return {
+        'email': user_info['email'],
+        'name': user_info.get('name'),
+        'profile_pic_url': user_info.get('picture'),
+    }
+
+
+async def get_google_identity(http, access_token):
+    digest = hashlib.sha256(access_token.encode()).digest()
+    identity = _identities.get(digest)
+    if identity is not None:
+        return identity
+    task = _inflight.get(digest)
+    if task is None:
+        task = _inflight[digest] = asyncio.ensure_future(_fetch_identity(http, access_token))
+        task.add_done_callback(lambda _: _inflight.pop(digest, None))
+    identity = await asyncio.shield(task)
+    _identities[digest] = identity
+    return identity
+
+
+async def get_or_create_user(users, identity):
+    """Fetch the user for identity, creating it on first sign-in, in one atomic upsert."""
+    query = {'email': identity['email']}
+    update = {'$setOnInsert': identity}
+    try:
+        return await users.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # Lost an insert race against a concurrent first sign-in; the user exists now.
+        return await users.find_one(query)
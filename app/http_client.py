@@ -0,0 +1,81 @@
+"""
+Shared outbound HTTP client.
+
+A single pooled, keep-alive ``httpx.AsyncClient`` is created at startup and
+used for every call to Google and football-data.org, so a slow upstream only
+delays the requests waiting on it instead of blocking the event loop. Each
+upstream host is capped at HTTP_MAX_CONNECTIONS_PER_HOST concurrent requests,
+and transport errors and 429/5xx responses are retried with jittered
+exponential backoff. Every attempt is timed in
+``upstream_request_duration_seconds``.
+"""
+import asyncio
+import os
+import random
+import time
+
+import httpx
+from starlette.requests import HTTPConnection
+
+from .metrics import upstream_request_duration
+
+MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', 20))
+TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 10))
+RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+RETRY_BACKOFF = 0.2
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_connections_per_host=MAX_CONNECTIONS_PER_HOST,
+                 timeout=TIMEOUT, retries=RETRIES, backoff=RETRY_BACKOFF):
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=30),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5)),
+        )
+        self.max_connections_per_host = max_connections_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.host_limits = {}
+
+    def _host_limit(self, host):
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return self.host_limits[host]
+
+    async def request(self, method, url, **kwargs):
+        host = httpx.URL(url).host
+        limit = self._host_limit(host)
+        for attempt in range(self.retries + 1):
+            try:
+                async with limit:
+                    start = time.perf_counter()
+                    try:
+                        response = await self.client.request(method, url, **kwargs)
+                    except httpx.TransportError:
+                        upstream_request_duration.observe((host, method, 'error'), time.perf_counter() - start)
+                        raise
+                    upstream_request_duration.observe((host, method, str(response.status_code)),
+                                                      time.perf_counter() - start)
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def get_http(connection: HTTPConnection):
+    return connection.app.state.http
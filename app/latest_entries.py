@@ -0,0 +1,133 @@
+"""
+Shared feed behind the /latest_entries websocket.
+
+The five newest entries are loaded once per process with a single users
+$lookup. After that the feed follows a change stream on ``entries`` and pushes
+the refreshed list to every subscriber as soon as an entry is written or
+deleted. On deployments without change streams (a standalone mongod) the
+create_player and delete_player write paths publish those changes instead.
+"""
+import asyncio
+import logging
+
+from pymongo.errors import OperationFailure
+
+from .broadcast import Broadcaster
+
+logger = logging.getLogger(__name__)
+
+LATEST_COUNT = 5
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+def serialize(entry):
+    return {
+        '_id': str(entry['_id']),
+        'email': entry['email'],
+        'name': entry.get('name'),
+        'position': entry.get('position'),
+        'goals': entry.get('goals'),
+        'assists': entry.get('assists'),
+        'created_at': entry['created_at'].isoformat(),
+    }
+
+
+async def attach_names(db, entries):
+    emails = list({entry['email'] for entry in entries})
+    names = {}
+    async for user in db["users"].find({'email': {'$in': emails}}, {'_id': 0, 'email': 1, 'name': 1}):
+        names[user['email']] = user.get('name')
+    for entry in entries:
+        entry['name'] = names.get(entry['email'])
+    return entries
+
+
+class LatestEntries:
+    def __init__(self, db):
+        self.db = db
+        self.broadcaster = Broadcaster()
+        self.entries = []
+        self.task = None
+        self.watching = False
+        self.starting = asyncio.Lock()
+
+    async def load(self):
+        pipeline = [
+            {'$sort': {'created_at': -1}},
+            {'$limit': LATEST_COUNT},
+            {'$lookup': {'from': 'users', 'localField': 'email', 'foreignField': 'email', 'as': 'user'}},
+            {'$addFields': {'name': {'$arrayElemAt': ['$user.name', 0]}}},
+        ]
+        entries = [serialize(entry) async for entry in self.db["entries"].aggregate(pipeline)]
+        if entries != self.entries:
+            self.entries = entries
+            self.broadcaster.publish(self.entries)
+
+    async def subscribe(self):
+        # Held across load() so sockets connecting together start a single feed
+        async with self.starting:
+            if self.task is None:
+                await self.load()
+                self.task = asyncio.create_task(self.run())
+        return self.broadcaster.subscribe(self.entries)
+
+    def unsubscribe(self, queue):
+        self.broadcaster.unsubscribe(queue)
+
+    async def add(self, docs):
+        docs = await attach_names(self.db, [doc for doc in docs if 'created_at' in doc])
+        entries = {entry['_id']: entry for entry in self.entries}
+        for doc in docs:
+            entries[str(doc['_id'])] = serialize(doc)
+        latest = sorted(entries.values(), key=lambda entry: entry['created_at'], reverse=True)[:LATEST_COUNT]
+        if latest != self.entries:
+            self.entries = latest
+            self.broadcaster.publish(self.entries)
+
+    async def remove(self, entry_id):
+        # Reloading refills the list from the next newest entry
+        if any(entry['_id'] == str(entry_id) for entry in self.entries):
+            await self.load()
+
+    async def publish(self, entry):
+        """Called by the write path; a no-op while the change stream is live."""
+        if self.task is not None and not self.watching:
+            await self.add([entry])
+
+    async def unpublish(self, entry_id):
+        """Called by the write path after a delete; a no-op while the change stream is live."""
+        if self.task is not None and not self.watching:
+            await self.remove(entry_id)
+
+    async def run(self):
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}}]
+        while True:
+            try:
+                async with self.db["entries"].watch(pipeline, full_document='updateLookup') as stream:
+                    self.watching = True
+                    async for change in stream:
+                        if change['operationType'] == 'delete':
+                            await self.remove(change['documentKey']['_id'])
+                        elif change.get('fullDocument'):
+                            await self.add([change['fullDocument']])
+            except OperationFailure as exc:
+                if exc.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams unavailable, latest entries fed by the write path")
+                    return
+                logger.exception("Latest entries change stream failed")
+            except Exception:
+                logger.exception("Latest entries change stream failed")
+            finally:
+                self.watching = False
+            await asyncio.sleep(5)
+            # Catch up on anything written while the stream was down.
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Reloading latest entries failed")
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
@@ -0,0 +1,28 @@
+"""
+Deferred imports for heavy optional modules.
+
+``lazy_module('numpy')`` returns a stand-in that imports the real module on
+first attribute access, so importing a module that only needs numpy inside a
+few request handlers does not pay for numpy at process start.
+"""
+import importlib
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            module = self.__dict__['_module'] = importlib.import_module(self.__dict__['_name'])
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
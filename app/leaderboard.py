@@ -0,0 +1,331 @@
+"""
+Daily, weekly and monthly leaderboards.
+
+Rankings are kept materialized in the ``leaderboards`` collection (one row per
+period and user) and updated incrementally by the entry write path, so reading
+a page only touches the rows on that page. Windows are made of whole UTC days:
+``daily`` is today, ``weekly`` the last 7 days and ``monthly`` the last 30.
+``leaderboard_state`` records the first day each view still contains, and
+``run_expiry`` subtracts days that have aged out once per day boundary.
+
+``get_leaderboard`` recomputes a ranking from raw entries and is what the
+consistency checker compares the materialized view against:
+
+    python -m app.leaderboard check [period ...]
+    python -m app.leaderboard rebuild [period ...]
+"""
+import asyncio
+import logging
+import sys
+from datetime import timedelta
+
+from pymongo import IndexModel, ReplaceOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .days import day_start, utc_now
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+PERIOD_DAYS = {
+    'daily': 1,
+    'weekly': 7,
+    'monthly': 30,
+}
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+RANK_SORT = [('G/A', -1), ('goals', -1), ('email', 1)]
+
+indexes = {
+    "leaderboards": [
+        IndexModel([('period', ASCENDING), ('G/A', DESCENDING), ('goals', DESCENDING), ('email', ASCENDING)]),
+        IndexModel([('period', ASCENDING), ('email', ASCENDING)], unique=True),
+    ],
+}
+query_shapes = [
+    ("leaderboards", {'period': 'weekly'}, RANK_SORT),
+    ("leaderboards", {'period': 'weekly', 'email': ''}, None),
+]
+
+
+def window_start(period, now=None):
+    if period not in PERIOD_DAYS:
+        return None
+    return day_start(now or utc_now()) - timedelta(days=PERIOD_DAYS[period] - 1)
+
+
+def clamp_page_size(page_size):
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def ranking_pipeline(start_date, end_date=None, email=None):
+    created_at = {'$gte': start_date}
+    if end_date is not None:
+        created_at['$lt'] = end_date
+    match = {'created_at': created_at}
+    if email is not None:
+        match['email'] = email
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': '$email',
+            'goals': {'$sum': '$goals'},
+            'assists': {'$sum': '$assists'},
+            'games': {'$sum': 1},
+        }},
+        {'$addFields': {'G/A': {'$add': ['$goals', '$assists']}}},
+    ]
+
+
+def leaderboard_pipeline(start_date, page=0, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Build the aggregation that ranks users by goals + assists since start_date.
+
+    Scoring, grouping per user and the top-N cut all run inside MongoDB, so only
+    the requested page ever leaves the database. The users lookup runs after
+    $limit so it only joins the rows on the page.
+    """
+    page_size = clamp_page_size(page_size)
+    return ranking_pipeline(start_date) + [
+        {'$sort': {'G/A': -1, 'goals': -1, '_id': 1}},
+        {'$skip': max(page, 0) * page_size},
+        {'$limit': page_size},
+        {'$lookup': {
+            'from': 'users',
+            'localField': '_id',
+            'foreignField': 'email',
+            'as': 'user',
+        }},
+        {'$project': {
+            '_id': 0,
+            'email': '$_id',
+            'name': {'$arrayElemAt': ['$user.name', 0]},
+            'goals': 1,
+            'assists': 1,
+            'G/A': 1,
+            'games': 1,
+        }},
+    ]
+
+
+async def get_leaderboard(db, period, page=0, page_size=DEFAULT_PAGE_SIZE, now=None):
+    """Recompute a leaderboard page from raw entries."""
+    start_date = window_start(period, now)
+    if start_date is None:
+        return None
+    page_size = clamp_page_size(page_size)
+    rows = []
+    rank = max(page, 0) * page_size
+    async for row in db["entries"].aggregate(leaderboard_pipeline(start_date, page, page_size)):
+        rank += 1
+        row['rank'] = rank
+        rows.append(row)
+    return rows
+
+
+async def get_materialized_leaderboard(db, period, page=0, page_size=DEFAULT_PAGE_SIZE):
+    """Read a leaderboard page from the materialized view."""
+    if period not in PERIOD_DAYS:
+        return None
+    page_size = clamp_page_size(page_size)
+    rows = await db["leaderboards"].find(
+        {'period': period},
+        {'_id': 0, 'email': 1, 'goals': 1, 'assists': 1, 'G/A': 1, 'games': 1},
+    ).sort(RANK_SORT).skip(max(page, 0) * page_size).to_list(length=page_size)
+
+    names = {}
+    async for user in db["users"].find({'email': {'$in': [row['email'] for row in rows]}},
+                                       {'_id': 0, 'email': 1, 'name': 1}):
+        names[user['email']] = user.get('name')
+    rank = max(page, 0) * page_size
+    for row in rows:
+        rank += 1
+        row['name'] = names.get(row['email'])
+        row['rank'] = rank
+    return rows
+
+
+async def _increment(db, period, email, goals, assists, games):
+    collection = db["leaderboards"]
+    await collection.update_one(
+        {'period': period, 'email': email},
+        {'$inc': {'goals': goals, 'assists': assists, 'G/A': goals + assists, 'games': games}},
+        upsert=True
+    )
+    if games < 0:
+        await collection.delete_one({'period': period, 'email': email, 'games': {'$lte': 0}})
+
+
+async def apply_entry_delta(db, email, created_at, goals, assists, games):
+    """
+    Fold a change to one daily entry into every view whose window contains it.
+
+    Callers pass the difference between the new and the old entry: a same-day
+    overwrite is (new - old, games=0), a new entry is (values, games=1) and a
+    delete is (-values, games=-1).
+    """
+    if not (goals or assists or games):
+        return
+    day = day_start(created_at)
+    async for state in db["leaderboard_state"].find({'_id': {'$in': list(PERIOD_DAYS)}}):
+        if day >= state['window_start']:
+            await _increment(db, state['_id'], email, goals, assists, games)
+
+
+async def _replace_rows(collection, operations):
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        # An upsert that lost an insert race to a concurrent write; the row exists now, so replace it
+        errors = exc.details['writeErrors']
+        if any(error['code'] != DUPLICATE_KEY for error in errors):
+            raise
+        await collection.bulk_write([operations[error['index']] for error in errors], ordered=False)
+
+
+def _row_replacement(period, row):
+    return ReplaceOne(
+        {'period': period, 'email': row['_id']},
+        {'period': period, 'email': row['_id'], 'goals': row['goals'], 'assists': row['assists'],
+         'G/A': row['G/A'], 'games': row['games']},
+        upsert=True,
+    )
+
+
+async def rebuild(db, period, now=None):
+    """
+    Recompute the view for period from raw entries.
+
+    Rows are replaced one by one and rows for users no longer in the window are
+    deleted afterwards, so readers and concurrent entry writes never see an
+    empty board and a failed row does not stop the others.
+    """
+    start_date = window_start(period, now)
+    rows = await db["entries"].aggregate(ranking_pipeline(start_date)).to_list(length=None)
+    collection = db["leaderboards"]
+    if rows:
+        await _replace_rows(collection, [_row_replacement(period, row) for row in rows])
+    await collection.delete_many({'period': period, 'email': {'$nin': [row['_id'] for row in rows]}})
+    await db["leaderboard_state"].update_one(
+        {'_id': period}, {'$set': {'window_start': start_date}}, upsert=True
+    )
+    return len(rows)
+
+
+async def rebuild_user(db, email):
+    """Recompute email's row in every view from raw entries, for writes too large to apply as deltas."""
+    collection = db["leaderboards"]
+    async for state in db["leaderboard_state"].find({'_id': {'$in': list(PERIOD_DAYS)}}):
+        rows = await db["entries"].aggregate(ranking_pipeline(state['window_start'], email=email)).to_list(length=1)
+        if rows:
+            await _replace_rows(collection, [_row_replacement(state['_id'], rows[0])])
+        else:
+            await collection.delete_one({'period': state['_id'], 'email': email})
+
+
+async def _claim_rebuild(states, period, state, target):
+    """Advance a view's window straight to target; returns False if another worker got there first."""
+    if state is None:
+        try:
+            await states.insert_one({'_id': period, 'window_start': target})
+        except DuplicateKeyError:
+            return False
+        return True
+    claimed = await states.find_one_and_update(
+        {'_id': period, 'window_start': state['window_start']},
+        {'$set': {'window_start': target}}
+    )
+    return claimed is not None
+
+
+async def expire(db, now=None):
+    """
+    Age expired days out of every view.
+
+    Each expired day is claimed with a compare-and-set on leaderboard_state
+    before it is subtracted, so several workers can run this concurrently and
+    every day is removed exactly once. A view whose whole window has expired
+    is rebuilt instead, after claiming it the same way.
+    """
+    states = db["leaderboard_state"]
+    for period, days in PERIOD_DAYS.items():
+        target = window_start(period, now)
+        state = await states.find_one({'_id': period})
+        if state is None or target - state['window_start'] > timedelta(days=days):
+            if await _claim_rebuild(states, period, state, target):
+                await rebuild(db, period, now)
+            continue
+        day = state['window_start']
+        while day < target:
+            claimed = await states.find_one_and_update(
+                {'_id': period, 'window_start': day},
+                {'$set': {'window_start': day + timedelta(days=1)}}
+            )
+            if claimed is None:
+                break
+            async for row in db["entries"].aggregate(ranking_pipeline(day, day + timedelta(days=1))):
+                await _increment(db, period, row['_id'], -row['goals'], -row['assists'], -row['games'])
+            day += timedelta(days=1)
+
+
+async def run_expiry(db):
+    while True:
+        try:
+            await expire(db)
+        except Exception:
+            logger.exception("Leaderboard expiry failed")
+        now = utc_now()
+        next_day = day_start(now) + timedelta(days=1, seconds=5)
+        await asyncio.sleep((next_day - now).total_seconds())
+
+
+async def check_consistency(db, period):
+    """
+    Compare the materialized view for period against a full recompute.
+
+    Returns one dict per user whose totals differ, with the recomputed values
+    under 'expected' and the materialized ones under 'actual'.
+    """
+    state = await db["leaderboard_state"].find_one({'_id': period})
+    start_date = state['window_start'] if state else window_start(period)
+    fields = ('goals', 'assists', 'G/A', 'games')
+    expected = {}
+    async for row in db["entries"].aggregate(ranking_pipeline(start_date)):
+        expected[row['_id']] = {field: row[field] for field in fields}
+    actual = {}
+    async for row in db["leaderboards"].find({'period': period}):
+        actual[row['email']] = {field: row.get(field, 0) for field in fields}
+
+    drift = []
+    for email in sorted(expected.keys() | actual.keys()):
+        if expected.get(email) != actual.get(email):
+            drift.append({'email': email, 'expected': expected.get(email), 'actual': actual.get(email)})
+    return drift
+
+
+async def _main(command, periods):
+    from .db import DB_NAME, create_client
+
+    client = create_client()
+    db = client[DB_NAME]
+    failed = False
+    try:
+        for period in periods:
+            if command == 'rebuild':
+                print(f"{period}: rebuilt {await rebuild(db, period)} rows")
+                continue
+            drift = await check_consistency(db, period)
+            failed = failed or bool(drift)
+            print(f"{period}: {len(drift)} rows drifted")
+            for row in drift:
+                print(f"  {row['email']}: expected {row['expected']}, found {row['actual']}")
+    finally:
+        client.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ('check', 'rebuild'):
+        sys.exit("usage: python -m app.leaderboard check|rebuild [period ...]")
+    sys.exit(asyncio.run(_main(sys.argv[1], sys.argv[2:] or list(PERIOD_DAYS))))
@@ -0,0 +1,92 @@
+"""
+Shared football-data.org poller behind the /live_scores websocket.
+
+One poller runs per process no matter how many clients are connected. It
+starts with the first subscriber, fetches the match list over the shared
+HTTP client every LIVE_SCORES_POLL_INTERVAL seconds and publishes only what
+changed since the previous poll. Every message is an envelope:
+
+    {"type": "snapshot" | "update", "matches": [...], "removed": [match ids]}
+
+A ``snapshot`` carries the full list and replaces whatever the client holds;
+new subscribers get one first, and so does a client whose queue overflowed.
+An ``update`` carries the matches that changed, to merge by ``id``, and the
+ids of matches that dropped out of the upstream list, to delete.
+"""
+import asyncio
+import logging
+import os
+
+from .broadcast import Broadcaster
+
+logger = logging.getLogger(__name__)
+
+FOOTBALL_DATA_URL = os.getenv('FOOTBALL_DATA_URL', 'https://api.football-data.org/v4/matches')
+POLL_INTERVAL = float(os.getenv('LIVE_SCORES_POLL_INTERVAL', 600))
+
+
+def match_info(match):
+    return {
+        'id': match['id'],
+        'time': match['utcDate'],
+        'homeTeam': match['homeTeam']['name'],
+        'awayTeam': match['awayTeam']['name'],
+        'score': match['score']['fullTime'],
+        'homeCrest': match['homeTeam']['crest'],
+        'awayCrest': match['awayTeam']['crest']
+    }
+
+
+class LiveScores:
+    def __init__(self, http, api_key, interval=POLL_INTERVAL):
+        self.http = http
+        self.api_key = api_key
+        self.interval = interval
+        self.broadcaster = Broadcaster()
+        self.snapshot = {}
+        self.task = None
+
+    def matches(self):
+        return list(self.snapshot.values())
+
+    def snapshot_message(self):
+        return {'type': 'snapshot', 'matches': self.matches(), 'removed': []}
+
+    def subscribe(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return self.broadcaster.subscribe(self.snapshot_message() if self.snapshot else None)
+
+    def unsubscribe(self, queue):
+        self.broadcaster.unsubscribe(queue)
+
+    async def fetch(self):
+        response = await self.http.get(FOOTBALL_DATA_URL, headers={'X-Auth-Token': self.api_key})
+        response.raise_for_status()
+        return response.json()['matches']
+
+    async def poll(self):
+        current = {}
+        for match in await self.fetch():
+            info = match_info(match)
+            current[info['id']] = info
+        changed = [info for match_id, info in current.items() if self.snapshot.get(match_id) != info]
+        removed = [match_id for match_id in self.snapshot if match_id not in current]
+        self.snapshot = current
+        if changed or removed:
+            self.broadcaster.publish({'type': 'update', 'matches': changed, 'removed': removed},
+                                     resync=self.snapshot_message())
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Live scores poll failed")
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
@@ -0,0 +1,113 @@
+"""
+Historical match lookup behind /players/{day}/{month}/{goals}/{assists}.
+
+An offline build step reads the appearances and games CSVs once and writes a
+small columnar artifact to MATCH_INDEX_PATH: one row per distinct
+(month, day, goals, assists), holding the first appearance with that key in
+file order, already joined to its game's clubs and date. Keys are packed into
+a sorted int64 array, so a request is a single binary search.
+
+    python -m app.match_index build appearances.csv games.csv [output.npz]
+
+The artifact is loaded lazily, once per process, by the first request.
+"""
+import os
+import sys
+
+from fastapi import HTTPException
+
+from .lazy import lazy_module
+
+np = lazy_module('numpy')
+
+INDEX_PATH = os.getenv('MATCH_INDEX_PATH', 'match_index.npz')
+MAX_COUNT = 255
+
+NO_MATCH = {"player": "No player found", "home_team": "No team found", "away_team": "No team found"}
+
+
+def pack_keys(month, day, goals, assists):
+    """Pack (month, day, goals, assists) into one sortable int64; each part must fit in a byte."""
+    return (np.asarray(month, dtype=np.int64) << 24 | np.asarray(day, dtype=np.int64) << 16
+            | np.asarray(goals, dtype=np.int64) << 8 | np.asarray(assists, dtype=np.int64))
+
+
+class MatchIndex:
+    def __init__(self, keys, players, home_teams, away_teams, dates):
+        self.keys = keys
+        self.players = players
+        self.home_teams = home_teams
+        self.away_teams = away_teams
+        self.dates = dates
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in (self.keys, self.players, self.home_teams, self.away_teams, self.dates))
+
+    def lookup(self, day, month, goals, assists):
+        if not (1 <= month <= 12 and 1 <= day <= 31 and 0 <= goals <= MAX_COUNT and 0 <= assists <= MAX_COUNT):
+            return None
+        key = int(pack_keys(month, day, goals, assists))
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key or not self.players[i]:
+            return None
+        return {
+            "player": str(self.players[i]),
+            "home_team": str(self.home_teams[i]) or NO_MATCH["home_team"],
+            "away_team": str(self.away_teams[i]) or NO_MATCH["away_team"],
+            "date": str(self.dates[i]) or None,
+        }
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path) as data:
+            return cls(data['keys'], data['players'], data['home_teams'], data['away_teams'], data['dates'])
+
+
+def build(appearances_path, games_path, path=INDEX_PATH):
+    """Build the artifact from the raw CSVs; returns the number of keys written."""
+    import pandas as pd
+
+    appearances = pd.read_csv(appearances_path, usecols=['game_id', 'player_name', 'date', 'goals', 'assists'])
+    dates = pd.to_datetime(appearances['date'], errors='coerce')
+    valid = dates.notna() & appearances['goals'].between(0, MAX_COUNT) & appearances['assists'].between(0, MAX_COUNT)
+    appearances = appearances[valid]
+    dates = dates[valid]
+    appearances = appearances.assign(key=pack_keys(dates.dt.month, dates.dt.day,
+                                                   appearances['goals'].astype(np.int64),
+                                                   appearances['assists'].astype(np.int64)))
+    first = appearances.drop_duplicates('key', keep='first')
+
+    games = pd.read_csv(games_path, usecols=['game_id', 'home_club_name', 'away_club_name', 'date'])
+    games = games.drop_duplicates('game_id').rename(columns={'date': 'game_date'})
+    rows = first.merge(games, on='game_id', how='left').sort_values('key')
+
+    def strings(column):
+        return rows[column].fillna('').astype(str).to_numpy(dtype=np.str_)
+
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, keys=rows['key'].to_numpy(dtype=np.int64), players=strings('player_name'),
+             home_teams=strings('home_club_name'), away_teams=strings('away_club_name'), dates=strings('game_date'))
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+_index = None
+
+
+def get_match_index():
+    global _index
+    if _index is None:
+        if not os.path.exists(INDEX_PATH):
+            raise HTTPException(status_code=503, detail="Historical match index has not been built")
+        _index = MatchIndex.load(INDEX_PATH)
+    return _index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5) or sys.argv[1] != 'build':
+        sys.exit("usage: python -m app.match_index build appearances.csv games.csv [output.npz]")
+    print(f"wrote {build(*sys.argv[2:])} keys")
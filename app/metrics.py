@@ -0,0 +1,309 @@
+"""
+Request, MongoDB and upstream HTTP instrumentation.
+
+Metrics live in process memory and are rendered in the Prometheus text format
+by ``/metrics``:
+
+- ``MetricsMiddleware`` records a latency histogram, an in-flight gauge and a
+  status counter per route template (``/entries/{player_id}``, not the raw
+  path, so label cardinality stays bounded).
+- ``MongoCommandListener`` is registered on the Motor client and times every
+  command by collection and command name.
+- ``PoolCheckoutListener`` measures how long each command waited for a
+  pooled connection, and how many connections are checked out.
+- ``HttpClient`` times every outbound attempt by host and status.
+
+Requests slower than SLOW_REQUEST_SECONDS are logged, for a
+SLOW_REQUEST_SAMPLE_RATE fraction of them, together with the shapes of the
+MongoDB commands they issued (filter keys with the values stripped, and sorts).
+Motor runs commands on executor threads with the caller's context copied, so
+a context variable is enough to tie commands to the request that sent them.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter as Tally
+
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', 1.0))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', 1.0))
+MAX_RECORDED_COMMANDS = 100
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_request_commands = contextvars.ContextVar('request_commands', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels, value):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for labels, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+REGISTRY = []
+
+http_requests = Counter('http_requests_total', 'HTTP requests served.', ('method', 'route', 'status'))
+http_request_duration = Histogram('http_request_duration_seconds', 'HTTP request latency.', ('method', 'route'))
+http_requests_in_flight = Gauge('http_requests_in_flight', 'HTTP requests being served.', ('method', 'route'))
+mongo_command_duration = Histogram('mongo_command_duration_seconds', 'MongoDB command latency.',
+                                   ('collection', 'command'))
+mongo_command_failures = Counter('mongo_command_failures_total', 'Failed MongoDB commands.', ('collection', 'command'))
+mongo_pool_checkout_wait = Histogram('mongo_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+                                     ('address',), buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+mongo_pool_checkout_failures = Counter('mongo_pool_checkout_failures_total', 'Failed connection checkouts.',
+                                       ('address', 'reason'))
+mongo_pool_checked_out = Gauge('mongo_pool_connections_checked_out', 'Connections currently checked out.',
+                               ('address',))
+upstream_request_duration = Histogram('upstream_request_duration_seconds', 'Outbound HTTP request latency.',
+                                      ('host', 'method', 'status'))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _shape(value):
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shape(item) for item in value[:1]]
+    return '?'
+
+
+def query_shape(command_name, command):
+    """Describe a command by its collection, filter keys and sort, without the values."""
+    collection = command.get(command_name)
+    shape = {'command': command_name, 'collection': collection if isinstance(collection, str) else None}
+    for field in ('filter', 'query', 'q'):
+        if field in command:
+            shape[field] = _shape(command[field])
+    for field in ('sort', 'key'):
+        if field in command:
+            shape[field] = dict(command[field]) if isinstance(command[field], dict) else command[field]
+    if 'updates' in command:
+        shape['filter'] = _shape(command['updates'][0].get('q', {})) if command['updates'] else {}
+    if 'deletes' in command:
+        shape['filter'] = _shape(command['deletes'][0].get('q', {})) if command['deletes'] else {}
+    if 'pipeline' in command:
+        shape['pipeline'] = [next(iter(stage)) for stage in command['pipeline']]
+    return shape
+
+
+class MongoCommandListener(CommandListener):
+    def __init__(self):
+        self.pending = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        self.pending[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ''
+        commands = _request_commands.get()
+        if commands is not None and len(commands) < MAX_RECORDED_COMMANDS:
+            commands.append(repr(query_shape(event.command_name, event.command)))
+
+    def succeeded(self, event):
+        collection = self.pending.pop((event.connection_id, event.request_id), '')
+        mongo_command_duration.observe((collection, event.command_name), event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self.pending.pop((event.connection_id, event.request_id), '')
+        mongo_command_duration.observe((collection, event.command_name), event.duration_micros / 1e6)
+        mongo_command_failures.inc((collection, event.command_name))
+
+
+def _address(address):
+    return '{}:{}'.format(*address)
+
+
+class PoolCheckoutListener(ConnectionPoolListener):
+    """
+    Time connection checkouts.
+
+    PyMongo checks connections out synchronously on the executor thread that
+    runs the command, so the start time is kept per thread.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.perf_counter()
+
+    def _waited(self, address):
+        started = getattr(self.local, 'started', None)
+        if started is not None:
+            mongo_pool_checkout_wait.observe((address,), time.perf_counter() - started)
+            self.local.started = None
+
+    def connection_checked_out(self, event):
+        address = _address(event.address)
+        self._waited(address)
+        mongo_pool_checked_out.inc((address,))
+
+    def connection_check_out_failed(self, event):
+        address = _address(event.address)
+        self._waited(address)
+        mongo_pool_checkout_failures.inc((address, event.reason))
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec((_address(event.address),))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        mongo_pool_checked_out.set((_address(event.address),), 0)
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+
+def route_template(app, scope):
+    """The path template of the route scope will be dispatched to, resolved once per request."""
+    template = scope.get('route_template')
+    if template is None:
+        template = 'unmatched'
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+        scope['route_template'] = template
+    return template
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        labels = (scope['method'], route_template(scope['app'], scope))
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        commands = []
+        token = _request_commands.set(commands)
+        http_requests_in_flight.inc(labels)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec(labels)
+            _request_commands.reset(token)
+            http_request_duration.observe(labels, elapsed)
+            http_requests.inc(labels + (str(status),))
+            if elapsed > SLOW_REQUEST_SECONDS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+                shapes = '; '.join(f'{count}x {shape}' for shape, count in Tally(commands).most_common())
+                logger.warning("Slow request %s %s took %.3f s (status %s), %d Mongo commands: %s",
+                               labels[0], scope['path'], elapsed, status, len(commands), shapes or 'none')
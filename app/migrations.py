@@ -0,0 +1,103 @@
+"""
+One-off data migrations.
+
+    python -m app.migrations embed_injury_spots [--drop]
+    python -m app.migrations backfill_entry_days
+"""
+import asyncio
+import inspect
+import sys
+
+from pymongo import UpdateOne, DeleteOne
+
+from .days import day_key
+
+BATCH_SIZE = 500
+
+
+async def embed_injury_spots(db, drop=False):
+    """
+    Copy each injury's rows from ``injury_spots`` into an embedded
+    ``injury_spots`` array on the injury itself.
+
+    Injuries are processed in batches: one $in query fetches the spots for a
+    whole batch and one bulk_write stores them. Injuries with no separate spot
+    documents get their own ``location``. Already migrated injuries are
+    skipped, so the migration can be re-run safely. With drop=True the old
+    collection is dropped afterwards.
+    """
+    migrated = 0
+    cursor = db["injuries"].find({'injury_spots': {'$exists': False}}, {'location': 1})
+    while True:
+        batch = await cursor.to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+        spots = {}
+        async for spot in db["injury_spots"].find({'injury_id': {'$in': [str(injury['_id']) for injury in batch]}}):
+            spots.setdefault(spot['injury_id'], []).append({'x': spot['x'], 'y': spot['y']})
+        await db["injuries"].bulk_write([
+            UpdateOne(
+                {'_id': injury['_id']},
+                {'$set': {'injury_spots': spots.get(str(injury['_id'])) or [injury['location']]}}
+            )
+            for injury in batch
+        ], ordered=False)
+        migrated += len(batch)
+    if drop:
+        await db["injury_spots"].drop()
+    return migrated
+
+
+async def backfill_entry_days(db):
+    """
+    Give every entry a ``day`` key and remove same-day duplicates.
+
+    The unique (email, day) index only covers entries that have a ``day``, so
+    until this runs a legacy entry and a new one can share a day. Where a user
+    has several entries for one UTC day only the newest is kept;
+    rebuild the leaderboards and repair the rollups afterwards if any were
+    removed.
+    """
+    migrated = 0
+    seen = set()
+    requests = []
+    async for entry in db["entries"].find({}, {'email': 1, 'created_at': 1}).sort([('created_at', -1)]):
+        key = (entry['email'], day_key(entry['created_at']))
+        if key in seen:
+            requests.append(DeleteOne({'_id': entry['_id']}))
+        else:
+            seen.add(key)
+            requests.append(UpdateOne({'_id': entry['_id']}, {'$set': {'day': key[1]}}))
+        if len(requests) >= BATCH_SIZE:
+            await db["entries"].bulk_write(requests, ordered=False)
+            migrated += len(requests)
+            requests = []
+    if requests:
+        await db["entries"].bulk_write(requests, ordered=False)
+        migrated += len(requests)
+    return migrated
+
+
+MIGRATIONS = {
+    'embed_injury_spots': embed_injury_spots,
+    'backfill_entry_days': backfill_entry_days,
+}
+
+
+async def _main(name, drop):
+    from .db import DB_NAME, create_client
+
+    client = create_client()
+    try:
+        migration = MIGRATIONS[name]
+        kwargs = {'drop': drop} if 'drop' in inspect.signature(migration).parameters else {}
+        migrated = await migration(client[DB_NAME], **kwargs)
+        print(f"{name}: migrated {migrated} documents")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in MIGRATIONS:
+        sys.exit("usage: python -m app.migrations {} [--drop]".format('|'.join(MIGRATIONS)))
+    asyncio.run(_main(sys.argv[1], '--drop' in sys.argv[2:]))
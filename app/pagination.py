@@ -0,0 +1,47 @@
+"""
+Keyset (cursor) pagination helpers.
+
+List endpoints return a plain JSON list and, when more rows are available,
+an opaque continuation token in the X-Next-Cursor response header. Clients
+pass the token back as ``cursor`` to fetch the next page. The token encodes
+the sort key of the last row served, so each page is a range scan on an index
+and costs the same however deep it is.
+"""
+import base64
+import binascii
+
+from bson import json_util
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def clamp_limit(limit, maximum):
+    return max(1, min(limit, maximum))
+
+
+def paginate(rows, limit, response, cursor_fields):
+    """
+    Trim rows to limit and advertise the next page.
+
+    Callers fetch limit + 1 rows; the extra row only signals that another page
+    exists and is dropped here.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({field: rows[-1][field] for field in cursor_fields})
+    return rows
@@ -0,0 +1,156 @@
+"""
+Admission control: per-client rate limits and load shedding.
+
+``AdmissionMiddleware`` runs two checks before a request reaches its route.
+
+Load shedding: once MAX_IN_FLIGHT requests are being served, or the event
+loop is lagging by more than MAX_LOOP_LAG seconds, new requests get a 503
+with Retry-After straight away. This keeps the instance answering what it
+has already accepted instead of queueing more.
+
+Rate limits: each (route, client) pair gets a token bucket, where the client
+is the email of a valid bearer token or the caller's IP. Limits are set per
+route template in ROUTE_LIMITS and can be overridden with the RATE_LIMITS
+environment variable, e.g. ``{"POST /entries": [30, 10]}`` for 30 requests a
+minute with bursts of 10. A request over its limit gets a 429 with
+Retry-After.
+
+Buckets use the generic cell rate algorithm, so each one is a single float:
+the time at which the bucket will be full again. They live in an LRU bounded
+by RATE_LIMIT_MAX_KEYS. Evicting an idle client only resets its bucket to
+full, so memory stays fixed however many distinct clients show up.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+
+from cachetools import LRUCache
+from starlette.datastructures import Headers
+
+from .metrics import Counter, Gauge, route_template
+from .tokens import email_from_authorization
+
+MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', 200))
+MAX_LOOP_LAG = float(os.getenv('MAX_LOOP_LAG', 0.25))
+LOOP_LAG_INTERVAL = 0.1
+MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+
+# "METHOD /route/template": (requests per minute, burst)
+DEFAULT_LIMIT = (600, 100)
+ROUTE_LIMITS = {
+    'POST /entries': (30, 10),
+    'POST /entries/import': (6, 2),
+    'GET /turf_near_me': (20, 5),
+    'POST /auth/google': (20, 10),
+    'POST /friends/request/{recipient_email}': (30, 10),
+    **{route: tuple(limit) for route, limit in json.loads(os.getenv('RATE_LIMITS', '{}')).items()},
+}
+EXEMPT_ROUTES = {'/healthz', '/readyz', '/metrics'}
+
+rate_limited = Counter('rate_limited_requests_total', 'Requests rejected by a rate limit.', ('route',))
+shed = Counter('shed_requests_total', 'Requests rejected by load shedding.', ('reason',))
+loop_lag = Gauge('event_loop_lag_seconds', 'Delay of the latest event loop lag probe.')
+
+
+class RateLimiter:
+    def __init__(self, limits=ROUTE_LIMITS, default=DEFAULT_LIMIT, max_keys=MAX_KEYS):
+        self.limits = limits
+        self.default = default
+        self.buckets = LRUCache(maxsize=max_keys)
+
+    def check(self, route, client, now=None):
+        """Take one token for client on route; returns 0 if allowed, else the seconds to wait."""
+        per_minute, burst = self.limits.get(route, self.default)
+        interval = 60.0 / per_minute
+        tolerance = interval * (burst - 1)
+        now = time.monotonic() if now is None else now
+        key = (route, client)
+        full_at = max(self.buckets.get(key, now), now)
+        if full_at - now > tolerance:
+            return full_at - now - tolerance
+        self.buckets[key] = full_at + interval
+        return 0
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up, i.e. how busy the event loop is."""
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = 0.0
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - started - self.interval)
+            loop_lag.set((), self.lag)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+def client_address(scope, headers):
+    # Behind Render's proxy the caller is the last X-Forwarded-For hop; earlier hops are client supplied
+    forwarded = headers.get('x-forwarded-for')
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    return scope['client'][0] if scope.get('client') else 'unknown'
+
+
+async def _reject(send, status, retry_after, detail):
+    body = json.dumps({'detail': detail}).encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+        (b'retry-after', str(max(1, math.ceil(retry_after))).encode()),
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        state = scope['app'].state if scope['type'] == 'http' else None
+        limiter = getattr(state, 'rate_limiter', None)
+        if limiter is None:
+            return await self.app(scope, receive, send)
+        template = route_template(scope['app'], scope)
+        if template in EXEMPT_ROUTES:
+            return await self.app(scope, receive, send)
+
+        if self.in_flight >= MAX_IN_FLIGHT:
+            shed.inc(('in_flight',))
+            return await _reject(send, 503, 1, "Server busy")
+        if state.loop_lag.lag > MAX_LOOP_LAG:
+            shed.inc(('loop_lag',))
+            return await _reject(send, 503, 1, "Server busy")
+
+        headers = Headers(scope=scope)
+        client = email_from_authorization(headers.get('authorization')) or client_address(scope, headers)
+        route = f"{scope['method']} {template}"
+        retry_after = limiter.check(route, client)
+        if retry_after:
+            rate_limited.inc((route,))
+            return await _reject(send, 429, retry_after, "Too many requests")
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,254 @@
+"""
+HTTP response cache for read-heavy GET endpoints.
+
+``ResponseCacheMiddleware`` stores the full response of every route in
+CACHED_ROUTES and serves repeats from memory with an ETag and Last-Modified.
+A request whose If-None-Match (or If-Modified-Since) still matches gets an
+empty 304, whether the body came from the cache or was just rendered.
+
+Entries are keyed by path, query string, user and the versions of the
+namespaces the route depends on: ``user:<email>`` for a user's own entries
+and stats, ``friends:<email>``, ``injuries:<email>`` and the global
+``leaderboard``. Write handlers call ``invalidate`` with the namespaces they
+touch, which bumps their versions so old entries are never read again and age
+out of the LRU. Leaderboard keys also carry the UTC day, since the windows
+move at midnight without any write.
+
+The store is a pluggable backend. ``MemoryBackend`` is a per-process LRU with
+a TTL, so with several workers a write only invalidates its own worker and the
+others serve the old body for at most RESPONSE_CACHE_TTL seconds.
+``RedisBackend`` shares entries and versions through any client with the
+redis.asyncio get/set/incr/mget API.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from cachetools import TTLCache
+from starlette.datastructures import Headers
+from starlette.requests import Request
+
+from .days import day_key, utc_now
+from .tokens import email_from_authorization
+
+TTL = float(os.getenv('RESPONSE_CACHE_TTL', 60))
+MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_SIZE', 10000))
+
+LEADERBOARD = 'leaderboard'
+
+# Headers that describe the stored body rather than one particular response
+SKIPPED_HEADERS = {b'content-length', b'date', b'etag', b'last-modified', b'cache-control', b'vary'}
+
+
+def user_namespace(email):
+    return f'user:{email}'
+
+
+def friends_namespace(email):
+    return f'friends:{email}'
+
+
+def injuries_namespace(email):
+    return f'injuries:{email}'
+
+
+# (path pattern, namespaces the response depends on given the user's email or None)
+CACHED_ROUTES = [
+    (re.compile(r'^/player_leaderboard/[^/]+$'), lambda email: [LEADERBOARD]),
+    (re.compile(r'^/profile$'), lambda email: [user_namespace(email)]),
+    (re.compile(r'^/visualize/$'), lambda email: [user_namespace(email)]),
+    (re.compile(r'^/injuries$'), lambda email: [injuries_namespace(email)]),
+    (re.compile(r'^/friends/list$'), lambda email: [friends_namespace(email)]),
+]
+PUBLIC_NAMESPACES = {LEADERBOARD}
+
+
+class CachedResponse:
+    __slots__ = ('body', 'headers', 'etag', 'last_modified')
+
+    def __init__(self, body, headers, etag, last_modified):
+        self.body = body
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def encode(self):
+        meta = {'headers': [[k.decode('latin-1'), v.decode('latin-1')] for k, v in self.headers],
+                'etag': self.etag, 'last_modified': self.last_modified}
+        return json.dumps(meta).encode() + b'\n' + self.body
+
+    @classmethod
+    def decode(cls, data):
+        meta, _, body = data.partition(b'\n')
+        meta = json.loads(meta)
+        headers = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in meta['headers']]
+        return cls(body, headers, meta['etag'], meta['last_modified'])
+
+
+class MemoryBackend:
+    """In-process LRU with a TTL; namespace versions live as long as the process."""
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.entries = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.versions = {}
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, response):
+        self.entries[key] = response
+
+    async def get_versions(self, namespaces):
+        return [self.versions.get(namespace, 0) for namespace in namespaces]
+
+    async def bump(self, namespace):
+        self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """Shares entries and versions between workers through a redis.asyncio compatible client."""
+
+    def __init__(self, client, ttl=TTL, prefix='response-cache:'):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def get(self, key):
+        data = await self.client.get(self.prefix + key)
+        return CachedResponse.decode(data) if data is not None else None
+
+    async def set(self, key, response):
+        await self.client.set(self.prefix + key, response.encode(), ex=self.ttl)
+
+    async def get_versions(self, namespaces):
+        versions = await self.client.mget([f'{self.prefix}v:{namespace}' for namespace in namespaces])
+        return [int(version or 0) for version in versions]
+
+    async def bump(self, namespace):
+        await self.client.incr(f'{self.prefix}v:{namespace}')
+
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    async def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            await self.backend.bump(namespace)
+
+    async def key(self, path, query_string, email, namespaces):
+        versions = await self.backend.get_versions(namespaces)
+        parts = [path, query_string, email or ''] + [f'{n}={v}' for n, v in zip(namespaces, versions)]
+        if LEADERBOARD in namespaces:
+            parts.append(day_key(utc_now()))
+        return '|'.join(parts)
+
+    def stats(self):
+        served = self.hits + self.not_modified
+        total = served + self.misses
+        return {
+            'hits': self.hits,
+            'not_modified': self.not_modified,
+            'misses': self.misses,
+            'hit_ratio': round(served / total, 4) if total else None,
+        }
+
+
+def get_response_cache(request: Request):
+    return request.app.state.response_cache
+
+
+def make_etag(body):
+    return '"{}"'.format(hashlib.blake2b(body, digest_size=16).hexdigest())
+
+
+def is_fresh(request_headers, cached):
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or cached.etag in tags
+    if_modified_since = request_headers.get('if-modified-since')
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(cached.last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        cache = getattr(scope.get('app').state, 'response_cache', None) if scope.get('app') else None
+        if scope['type'] != 'http' or scope['method'] != 'GET' or cache is None:
+            return await self.app(scope, receive, send)
+        route = next((namespaces for pattern, namespaces in CACHED_ROUTES if pattern.match(scope['path'])), None)
+        if route is None:
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        email = email_from_authorization(headers.get('authorization'))
+        namespaces = route(email)
+        public = set(namespaces) <= PUBLIC_NAMESPACES
+        if email is None and not public:
+            # Unauthenticated; let the handler produce its error
+            return await self.app(scope, receive, send)
+        key = await cache.key(scope['path'], scope['query_string'].decode('latin-1'),
+                              None if public else email, namespaces)
+
+        cached = await cache.backend.get(key)
+        if cached is not None:
+            if is_fresh(headers, cached):
+                cache.not_modified += 1
+                return await self._send(send, 304, cached, public, body=False)
+            cache.hits += 1
+            return await self._send(send, 200, cached, public)
+
+        cache.misses += 1
+        start, chunks = None, []
+
+        async def capture(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                start = message
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, receive, capture)
+        body = b''.join(chunks)
+        if start['status'] != 200:
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        cached = CachedResponse(
+            body,
+            [(k, v) for k, v in start['headers'] if k.lower() not in SKIPPED_HEADERS],
+            make_etag(body),
+            formatdate(time.time(), usegmt=True),
+        )
+        await cache.backend.set(key, cached)
+        if is_fresh(headers, cached):
+            return await self._send(send, 304, cached, public, body=False)
+        await self._send(send, 200, cached, public)
+
+    @staticmethod
+    async def _send(send, status, cached, public, body=True):
+        headers = [
+            (b'etag', cached.etag.encode()),
+            (b'last-modified', cached.last_modified.encode()),
+            (b'cache-control', b'no-cache' if public else b'private, no-cache'),
+        ]
+        if not public:
+            headers.append((b'vary', b'Authorization'))
+        if body:
+            headers += cached.headers + [(b'content-length', str(len(cached.body)).encode())]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': cached.body if body else b''})
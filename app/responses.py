@@ -0,0 +1,37 @@
+"""
+JSON responses rendered with orjson.
+
+``BSONJSONResponse`` is the application's default response class. Its encoder
+understands the BSON types Mongo documents come back with (ObjectId as its hex
+string, datetime natively), so documents can be returned as they are read,
+without converting _id first. Handlers on hot paths return it directly, which
+also skips FastAPI's generic ``jsonable_encoder`` pass; their
+``response_model`` then only documents the schema.
+"""
+import orjson
+from bson import Decimal128, ObjectId
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    return orjson.dumps(content, default=default, option=OPTIONS)
+
+
+class BSONJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
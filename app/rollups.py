@@ -0,0 +1,203 @@
+"""
+Per-user stats rollups.
+
+Each user has one ``user_stats`` document (``_id`` is the email) holding
+lifetime totals, totals per ISO week and per month, and playing streaks:
+
+    {
+        "lifetime": {"goals": 12, "assists": 7, "games": 9},
+        "weeks": {"2024-W18": {...}},
+        "months": {"2024-05": {...}},
+        "last_played": "2024-05-03",
+        "current_streak": 3,
+        "longest_streak": 5
+    }
+
+The entry write path applies each change as a $inc delta, so reading a
+user's stats is a single _id lookup. A user who had entries before rollups
+existed has no document yet; the first read or write for them builds it from
+their entries. ``repair`` rebuilds rollups from raw entries and reports any
+that had drifted:
+
+    python -m app.rollups repair [email ...] [--dry-run]
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from .days import day_key, utc_now
+
+COUNTERS = ('goals', 'assists', 'games')
+
+query_shapes = [
+    ("user_stats", {'_id': ''}, None),
+]
+
+
+def _periods(dt):
+    year, week, _ = dt.isocalendar()
+    return ['lifetime', f'weeks.{year}-W{week:02d}', f'months.{dt:%Y-%m}']
+
+
+def _streaks(days):
+    """Return (current, longest) streak for an ascending list of distinct YYYY-MM-DD days."""
+    current = longest = 0
+    previous = None
+    for day in days:
+        date = datetime.strptime(day, '%Y-%m-%d')
+        current = current + 1 if previous and date - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = date
+    return current, longest
+
+
+async def _record_play(db, email, created_at):
+    today = day_key(created_at)
+    yesterday = day_key(created_at - timedelta(days=1))
+    await db["user_stats"].update_one({'_id': email}, [
+        {'$set': {'current_streak': {'$switch': {
+            'branches': [
+                {'case': {'$eq': ['$last_played', today]}, 'then': '$current_streak'},
+                {'case': {'$eq': ['$last_played', yesterday]},
+                 'then': {'$add': [{'$ifNull': ['$current_streak', 0]}, 1]}},
+            ],
+            'default': 1,
+        }}}},
+        {'$set': {
+            'longest_streak': {'$max': [{'$ifNull': ['$longest_streak', 0]}, '$current_streak']},
+            'last_played': {'$max': [{'$ifNull': ['$last_played', '']}, today]},
+        }},
+    ])
+
+
+async def _rebuild_streaks(db, email):
+    days = sorted({
+        day_key(entry['created_at'])
+        async for entry in db["entries"].find({'email': email}, {'_id': 0, 'created_at': 1})
+    })
+    current, longest = _streaks(days)
+    await db["user_stats"].update_one({'_id': email}, {'$set': {
+        'last_played': days[-1] if days else None,
+        'current_streak': current,
+        'longest_streak': longest,
+    }})
+
+
+async def apply_entry_delta(db, email, created_at, goals, assists, games):
+    """
+    Apply the change to one daily entry to the user's rollup.
+
+    Takes the same deltas as leaderboard.apply_entry_delta: new - old with
+    games=0 for a same-day overwrite, the values with games=1 for a new entry
+    and the negated values with games=-1 for a delete.
+    """
+    if not (goals or assists or games):
+        return
+    inc = {}
+    for period in _periods(created_at):
+        inc[f'{period}.goals'] = goals
+        inc[f'{period}.assists'] = assists
+        inc[f'{period}.games'] = games
+    result = await db["user_stats"].update_one({'_id': email}, {'$inc': inc}, upsert=True)
+    if result.upserted_id is not None:
+        # First rollup for this user; the entry is already written, so build it from all of their entries
+        await repair(db, [email])
+        return
+    if games > 0:
+        await _record_play(db, email, created_at)
+    elif games < 0:
+        # Drop week and month buckets emptied by the delete, as _compute never produces them
+        for period in _periods(created_at)[1:]:
+            await db["user_stats"].update_one({'_id': email, f'{period}.games': {'$lte': 0}},
+                                              {'$unset': {period: ''}})
+        await _rebuild_streaks(db, email)
+
+
+def _with_ga(totals):
+    return {**{counter: totals.get(counter, 0) for counter in COUNTERS},
+            'G/A': totals.get('goals', 0) + totals.get('assists', 0)}
+
+
+async def get_stats(db, email, now=None):
+    stats = await db["user_stats"].find_one({'_id': email})
+    if stats is None:
+        await repair(db, [email])
+        stats = await db["user_stats"].find_one({'_id': email}) or {}
+    now = now or utc_now()
+    # A streak only counts as current if the user played today or yesterday
+    current_streak = stats.get('current_streak', 0)
+    if not stats.get('last_played') or stats['last_played'] < day_key(now - timedelta(days=1)):
+        current_streak = 0
+    return {
+        'lifetime': _with_ga(stats.get('lifetime', {})),
+        'weeks': {week: _with_ga(totals) for week, totals in stats.get('weeks', {}).items()},
+        'months': {month: _with_ga(totals) for month, totals in stats.get('months', {}).items()},
+        'last_played': stats.get('last_played'),
+        'current_streak': current_streak,
+        'longest_streak': stats.get('longest_streak', 0),
+    }
+
+
+def _empty():
+    return {counter: 0 for counter in COUNTERS}
+
+
+def _compute(entries):
+    rollup = {'lifetime': _empty(), 'weeks': {}, 'months': {}}
+    days = set()
+    for entry in entries:
+        days.add(day_key(entry['created_at']))
+        year, week, _ = entry['created_at'].isocalendar()
+        for totals in (rollup['lifetime'],
+                       rollup['weeks'].setdefault(f'{year}-W{week:02d}', _empty()),
+                       rollup['months'].setdefault(f"{entry['created_at']:%Y-%m}", _empty())):
+            totals['goals'] += entry['goals']
+            totals['assists'] += entry['assists']
+            totals['games'] += 1
+    days = sorted(days)
+    rollup['current_streak'], rollup['longest_streak'] = _streaks(days)
+    rollup['last_played'] = days[-1] if days else None
+    return rollup
+
+
+async def repair(db, emails=None, dry_run=False):
+    """
+    Recompute rollups from raw entries, one user at a time.
+
+    Returns the emails whose stored rollup differed from the recomputed one.
+    Unless dry_run is set, drifted rollups are overwritten.
+    """
+    if emails is None:
+        emails = await db["entries"].distinct('email')
+    drifted = []
+    fields = ('lifetime', 'weeks', 'months', 'last_played', 'current_streak', 'longest_streak')
+    for email in emails:
+        entries = db["entries"].find({'email': email}, {'_id': 0, 'created_at': 1, 'goals': 1, 'assists': 1})
+        expected = _compute([entry async for entry in entries])
+        stored = await db["user_stats"].find_one({'_id': email}) or {}
+        if any(stored.get(field) != expected[field] for field in fields):
+            drifted.append(email)
+            if not dry_run:
+                await db["user_stats"].replace_one({'_id': email}, expected, upsert=True)
+    return drifted
+
+
+async def _main(emails, dry_run):
+    from .db import DB_NAME, create_client
+
+    client = create_client()
+    try:
+        drifted = await repair(client[DB_NAME], emails or None, dry_run)
+        for email in drifted:
+            print(f"drift: {email}")
+        print(f"{len(drifted)} rollups drifted" + ("" if dry_run else " and were rebuilt"))
+    finally:
+        client.close()
+    return 1 if drifted and dry_run else 0
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:] or sys.argv[1] != 'repair':
+        sys.exit("usage: python -m app.rollups repair [email ...] [--dry-run]")
+    args = sys.argv[2:]
+    sys.exit(asyncio.run(_main([arg for arg in args if arg != '--dry-run'], '--dry-run' in args)))
@@ -1,44 +1,42 @@
-from fastapi import APIRouter, Depends, WebSocket
-from starlette.requests import Request
-from datetime import datetime, timedelta
-from .temp import fix_object_id, maps_api_key
-import requests
-import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException, WebSocket
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from .temp import maps_api_key
+from ..leaderboard import get_materialized_leaderboard, DEFAULT_PAGE_SIZE
+from ..broadcast import pump
+from ..db import get_analytics_db
+from ..match_index import get_match_index, NO_MATCH
+from ..responses import BSONJSONResponse
+from ..http_client import get_http
+from ..turf_cache import get_turf_cache
+from ..turf_index import get_turf_index
+import httpx
 import os
-import asyncio
 
-def get_db(request: Request):
-    db = request.app.state.client["TestDB"]
-    return db
 
-
-football_data_org_api_key = os.getenv('FOOTBALL_DATA_ORG_API_KEY')
+places_search_url = os.getenv('PLACES_SEARCH_URL', 'https://places.googleapis.com/v1/places:searchText')
+search_radius_m = 2500.0
+max_places = 5
 router = APIRouter()
 
 
-@router.get("/player_leaderboard/{period}")
-async def get_player_leaderboard(period: str, db=Depends(get_db)):
-    collection = db["players"]
-    players = []
-    now = datetime.now()
-
-    if period == 'daily':
-        start_date = now - timedelta(days=1)
-    elif period == 'weekly':
-        start_date = now - timedelta(weeks=1)
-    elif period == 'monthly':
-        start_date = now - timedelta(days=30)
-    else:
-        return "Invalid period. Please choose from 'daily', 'weekly', or 'monthly'."
-
-    async for player in collection.find({"created_at": {"$gte": start_date}}):
-        players.append(fix_object_id(player))
+class LeaderboardRow(BaseModel):
+    rank: int
+    email: str
+    name: Optional[str]
+    goals: int
+    assists: int
+    ga: int = Field(alias='G/A')
+    games: int
 
-    df = pd.DataFrame(players)
-    df['G/A'] = df['goals'] + df['assists']
-    df = df.sort_values(by='G/A', ascending=False)
 
-    return df.to_dict(orient='records')
+@router.get("/player_leaderboard/{period}", response_model=List[LeaderboardRow])
+async def get_player_leaderboard(period: str, page: int = 0, page_size: int = DEFAULT_PAGE_SIZE,
+                                 db=Depends(get_analytics_db)):
+    players = await get_materialized_leaderboard(db, period, page, page_size)
+    if players is None:
+        return BSONJSONResponse("Invalid period. Please choose from 'daily', 'weekly', or 'monthly'.")
+    return BSONJSONResponse(players)
 
 
 from math import radians, sin, cos, sqrt, atan2
@@ -57,9 +55,7 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return round(distance, 2)
 
-@router.get("/turf_near_me")
-async def get_turf_near_me(lat: float, long: float):
-    base_url = f'https://places.googleapis.com/v1/places:searchText'
+async def search_places(http, lat, long):
     params = {
         'key': maps_api_key,
     }
@@ -71,92 +67,72 @@ async def get_turf_near_me(lat: float, long: float):
                     'latitude': lat,
                     'longitude': long
                 },
-                'radius': 2500.0
+                'radius': search_radius_m
             }
         },
-        "maxResultCount": 5
+        "maxResultCount": max_places
     }
     headers = {
         'X-Goog-FieldMask': 'places.displayName,places.location,places.googleMapsUri'
     }
-    response = requests.post(base_url, params=params, json=request_body, headers=headers).json()
-    
-    # Add distance to each place
-    for place in response.get('places', []):
-        place['distance_km'] = calculate_distance(
-            lat, 
+    try:
+        response = await http.post(places_search_url, params=params, json=request_body, headers=headers)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="Places search failed")
+    return response.json().get('places', [])
+
+
+@router.get("/turf_near_me")
+async def get_turf_near_me(lat: float, long: float, http=Depends(get_http), cache=Depends(get_turf_cache),
+                           index=Depends(get_turf_index)):
+    # Answer from turfs we already know about when there are enough of them close by
+    places = index.query(lat, long, k=max_places, radius_km=search_radius_m / 1000)
+    if len(places) >= max_places:
+        return {'places': places}
+
+    async def fetch(center_lat, center_long):
+        places = await search_places(http, center_lat, center_long)
+        index.add(places)
+        return places
+
+    places = await cache.get(lat, long, fetch)
+
+    # Add the caller's distance to each place; cached places are shared and never mutated
+    places = [
+        dict(place, distance_km=calculate_distance(
+            lat,
             long,
             place['location']['latitude'],
             place['location']['longitude']
-        )
+        ))
+        for place in places
+    ]
     # Sort places by distance
-    response['places'] = sorted(response.get('places', []), key=lambda x: x['distance_km'])
-    
-    return response
+    return {'places': sorted(places, key=lambda x: x['distance_km'])}
 
 
 @router.get("/players/{day}/{month}/{goals}/{assists}")
-async def get_players(day: int, month: int, goals: int, assists: int):
-    return {"Feature incomplete": "This feature is not yet implemented."}
-    # df=pd.read_csv('backend/appearances.csv')
-    # df['date'] = pd.to_datetime(df['date'])
-    # df['month_day'] = df['date'].apply(lambda x: (x.month, x.day))
-    # filtered_df = df[df['month_day'] == (month, day)]
-
-    # # Filter players who have exactly the same number of goals and assists as specified
-    # filtered_df = filtered_df[(filtered_df['goals'] == goals) & (filtered_df['assists'] == assists)]
-
-    # # Get the first player and game_id
-    # first_player = filtered_df.iloc[0]['player_name']
-    # game_id = filtered_df.iloc[0]['game_id']
-
-    # if pd.isnull(first_player) or pd.isnull(game_id):
-    #     return {"player": "No player found", "home_team": "No team found", "away_team": "No team found"}
-
-    # # Load the other CSV file
-    # df2 = pd.read_csv('backend/games.csv')
-
-    # # Find the row with the matching game_id
-    # game_row = df2[df2['game_id'] == game_id].iloc[0]
-
-    # # Get the home_team_name and away_team_name
-    # home_team_name = game_row['home_club_name']
-    # away_team_name = game_row['away_club_name']
-    # date=game_row['date']
-
-    # return {"player": first_player, "home_team": home_team_name, "away_team": away_team_name, "date": date}
+async def get_players(day: int, month: int, goals: int, assists: int, index=Depends(get_match_index)):
+    # First historical appearance on this calendar day with the same goals and assists
+    return index.lookup(day, month, goals, assists) or NO_MATCH
 
 @router.websocket("/live_scores")
 async def get_live_scores_websocket(websocket: WebSocket):
     await websocket.accept()
-    while True:
-        uri = 'https://api.football-data.org/v4/matches'
-        headers = {'X-Auth-Token': football_data_org_api_key}
-        response = requests.get(uri, headers=headers)
-        matches = []
-        for match in response.json()['matches']:
-            match_info = {
-                'time': match['utcDate'],
-                'homeTeam': match['homeTeam']['name'],
-                'awayTeam': match['awayTeam']['name'],
-                'score': match['score']['fullTime'],
-                'homeCrest': match['homeTeam']['crest'],
-                'awayCrest': match['awayTeam']['crest']
-            }
-            matches.append(match_info)
-
-        await websocket.send_json(matches)
-        await asyncio.sleep(600)
+    live_scores = websocket.app.state.live_scores
+    queue = live_scores.subscribe()
+    try:
+        await pump(websocket, queue)
+    finally:
+        live_scores.unsubscribe(queue)
 
 @router.websocket("/latest_entries")
-async def get_latest_entries_websocket(websocket: WebSocket, db=Depends(get_db)):
+async def get_latest_entries_websocket(websocket: WebSocket):
     await websocket.accept()
-    while True:
-        collection = db["entries"]
-        entries = []
-        # Get the latest 5 entries
-        async for entry in collection.find().sort("created_at", -1).limit(5):
-            entry['name'] = await db['users'].find_one({'email': entry['email']})['name']
-            entries.append(fix_object_id(entry))
-        await websocket.send_json(entries)
-        await asyncio.sleep(60)
+    latest_entries = websocket.app.state.latest_entries
+    queue = await latest_entries.subscribe()
+    try:
+        await pump(websocket, queue)
+    finally:
+        latest_entries.unsubscribe(queue)
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-from starlette.requests import Request
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 from bson import ObjectId
-from .temp import verify_jwt
+from pymongo import IndexModel, ASCENDING
+from .temp import verify_jwt, date_range_query
+from ..db import get_db, get_analytics_db
+from ..pagination import clamp_limit, decode_cursor, paginate
+from ..responses import BSONJSONResponse
+from ..response_cache import get_response_cache, friends_namespace
+from ..user_loader import get_user_loader
+from ..friend_graph import add_friendship, friend_sets
+from ..timeseries import load_series, DEFAULT_POINTS
+import asyncio
 
 class FriendRequest(BaseModel):
     sender_email: str
@@ -13,11 +21,22 @@ class FriendRequest(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime]
 
-def get_db(request: Request):
-    return request.app.state.client["TestDB"]
-
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+indexes = {
+    "friend_requests": [
+        IndexModel([("recipient_email", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("sender_email", ASCENDING), ("recipient_email", ASCENDING), ("status", ASCENDING)]),
+    ],
+}
+query_shapes = [
+    ("friend_requests", {'recipient_email': "", 'status': 'pending'}, [('_id', 1)]),
+    ("friend_requests", {'sender_email': "", 'recipient_email': "", 'status': 'pending'}, None),
+]
+
 @router.post('/request/{recipient_email}')
 async def send_friend_request(recipient_email: str, db=Depends(get_db), user=Depends(verify_jwt)):
     # Validate recipient exists
@@ -27,7 +46,7 @@ async def send_friend_request(recipient_email: str, db=Depends(get_db), user=Dep
     
     # Check if request already exists
     existing_request = await db.friend_requests.find_one({
-        'sender_email': user['email'],
+        'sender_email': user.email,
         'recipient_email': recipient_email,
         'status': 'pending'
     })
@@ -35,7 +54,7 @@ async def send_friend_request(recipient_email: str, db=Depends(get_db), user=Dep
         raise HTTPException(status_code=400, detail="Request already sent")
 
     request = {
-        'sender_email': user['email'],
+        'sender_email': user.email,
         'recipient_email': recipient_email,
         'status': 'pending',
         'created_at': datetime.utcnow()
@@ -44,13 +63,18 @@ async def send_friend_request(recipient_email: str, db=Depends(get_db), user=Dep
     return {"message": "Friend request sent"}
 
 @router.post('/accept/{request_id}')
-async def accept_friend_request(request_id: str, db=Depends(get_db), user=Depends(verify_jwt)):
-    request = await db.friend_requests.find_one({'_id': ObjectId(request_id)})
-    if not request or request['recipient_email'] != user['email']:
+async def accept_friend_request(request_id: str, db=Depends(get_db), user=Depends(verify_jwt),
+                                cache=Depends(get_response_cache)):
+    if not ObjectId.is_valid(request_id):
         raise HTTPException(status_code=404, detail="Request not found")
-    
-    await db.friend_requests.update_one(
-        {'_id': ObjectId(request_id)},
+
+    # Only a pending request addressed to this user can be accepted, and only once
+    request = await db.friend_requests.find_one_and_update(
+        {
+            '_id': ObjectId(request_id),
+            'recipient_email': user.email,
+            'status': 'pending'
+        },
         {
             '$set': {
                 'status': 'accepted',
@@ -58,111 +82,97 @@ async def accept_friend_request(request_id: str, db=Depends(get_db), user=Depend
             }
         }
     )
-    
-    friendship = {
-        'user1_email': request['sender_email'],
-        'user2_email': request['recipient_email'],
-        'created_at': datetime.utcnow()
-    }
-    await db.friendships.insert_one(friendship)
-    
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+
+    await add_friendship(db, request['sender_email'], request['recipient_email'])
+    await cache.invalidate(friends_namespace(request['sender_email']), friends_namespace(request['recipient_email']))
+
     return {"message": "Friend request accepted"}
 
 @router.get('/list')
-async def get_friends(db=Depends(get_db), user=Depends(verify_jwt)):
-    friendships = await db.friendships.find({
-        '$or': [
-            {'user1_email': user['email']},
-            {'user2_email': user['email']}
-        ]
-    }).to_list(length=None)
-    
-    friend_emails = []
-    for friendship in friendships:
-        friend_email = friendship['user2_email'] if friendship['user1_email'] == user['email'] else friendship['user1_email']
-        friend_emails.append(friend_email)
-    
-    friends = await db.users.find({
-        'email': {'$in': friend_emails}
-    }).to_list(length=None)
-    
-    return [{'email': f['email'], 'name': f['name'], 'profile_pic_url': f['profile_pic_url']} for f in friends]
+async def get_friends(
+    response: Response,
+    db=Depends(get_db),
+    user=Depends(verify_jwt),
+    users=Depends(get_user_loader),
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+):
+    limit = clamp_limit(limit, MAX_PAGE_SIZE)
+    query = {'user_email': user.email}
+    if cursor:
+        query['friend_email'] = {'$gt': decode_cursor(cursor).get('friend_email')}
+    edges = await db.friend_edges.find(query, {'_id': 0, 'friend_email': 1}).sort('friend_email', 1).to_list(length=limit + 1)
+    edges = paginate(edges, limit, response, ['friend_email'])
+
+    friends = await users.load_many([edge['friend_email'] for edge in edges])
+    return BSONJSONResponse([friend for friend in friends if friend], headers=response.headers)
 
 @router.get('/requests')
-async def get_friend_requests(db=Depends(get_db), user=Depends(verify_jwt)):
-    requests = await db.friend_requests.find({
-        'recipient_email': user['email'],
+async def get_friend_requests(
+    response: Response,
+    db=Depends(get_db),
+    user=Depends(verify_jwt),
+    users=Depends(get_user_loader),
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+):
+    limit = clamp_limit(limit, MAX_PAGE_SIZE)
+    query = {
+        'recipient_email': user.email,
         'status': 'pending'
-    }).to_list(length=None)
-    
-    for request in requests:
-        sender = await db.users.find_one({'email': request['sender_email']})
-        request['sender'] = {
-            'email': sender['email'],
-            'name': sender['name'],
-            'profile_pic_url': sender['profile_pic_url']
-        }
-        request['_id'] = str(request['_id'])  # Convert ObjectId to string
-    
-    return requests
+    }
+    if cursor:
+        query['_id'] = {'$gt': decode_cursor(cursor).get('_id')}
+    requests = await db.friend_requests.find(query).sort('_id', 1).to_list(length=limit + 1)
+    requests = paginate(requests, limit, response, ['_id'])
+
+    senders = await users.load_many([request['sender_email'] for request in requests])
+    for request, sender in zip(requests, senders):
+        request['sender'] = sender
+
+    return BSONJSONResponse(requests, headers=response.headers)
 
 @router.get("/visualize/{friend_email}")
 async def visualize_friend(
-    friend_email: str, 
-    db=Depends(get_db), 
+    friend_email: str,
+    db=Depends(get_analytics_db),
     user=Depends(verify_jwt),
-    start_date: Optional[str] = None, 
+    users=Depends(get_user_loader),
+    start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    compare: bool = False
+    compare: bool = False,
+    bucket: Literal['day', 'week', 'month'] = 'day',
+    series: Literal['raw', 'cumulative', 'rolling'] = 'raw',
+    window: int = 7,
+    points: int = DEFAULT_POINTS
 ):
     # Verify friendship
-    friendship = await db.friendships.find_one({
-        '$or': [
-            {'user1_email': user['email'], 'user2_email': friend_email},
-            {'user1_email': friend_email, 'user2_email': user['email']}
-        ]
-    })
-    
+    friendship = await friend_sets.are_friends(db, user.email, friend_email)
+
     if not friendship:
         raise HTTPException(status_code=403, detail="Not authorized to view this user's stats")
 
-    # Build query
-    query = {}
-    if start_date and end_date:
-        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-        query["created_at"] = {
-            "$gte": start_date_obj,
-            "$lt": end_date_obj
-        }
-
-    # Get friend's records
-    friend_records = await db.entries.find({
-        **query,
-        "email": friend_email
-    }).sort("created_at", 1).to_list(length=100)
+    # Both users' series come back from one aggregation, names from one users query
+    emails = [friend_email, user.email] if compare else [friend_email]
+    query = date_range_query(start_date, end_date)
+    user_series, profiles = await asyncio.gather(
+        load_series(db, emails, bucket, query, series, window, points),
+        users.load_many(emails)
+    )
 
     response = {
         "friend": {
-            "name": (await db.users.find_one({"email": friend_email}))["name"],
-            "dates": [record["created_at"].isoformat() for record in friend_records],
-            "goals": [record["goals"] for record in friend_records],
-            "assists": [record["assists"] for record in friend_records]
+            "name": profiles[0]["name"] if profiles[0] else None,
+            **user_series[friend_email]
         }
     }
 
     if compare:
-        # Get current user's records
-        user_records = await db.entries.find({
-            **query,
-            "email": user["email"]
-        }).sort("created_at", 1).to_list(length=100)
-
         response["user"] = {
-            "name": (await db.users.find_one({"email": user["email"]}))["name"],
-            "dates": [record["created_at"].isoformat() for record in user_records],
-            "goals": [record["goals"] for record in user_records],
-            "assists": [record["assists"] for record in user_records]
+            "name": profiles[1]["name"] if profiles[1] else None,
+            **user_series[user.email]
         }
 
-    return response
\ No newline at end of file
+    return response
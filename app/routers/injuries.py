@@ -2,12 +2,23 @@ from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from .players import get_db
-from .temp import verify_jwt, fix_object_id
+from pymongo import IndexModel, ASCENDING
+from bson import ObjectId
+from ..db import get_db
+from .temp import verify_jwt
+from ..responses import BSONJSONResponse
+from ..response_cache import get_response_cache, injuries_namespace
 from datetime import datetime
 
 router = APIRouter()
 
+indexes = {
+    "injuries": [IndexModel([("email", ASCENDING)])],
+}
+query_shapes = [
+    ("injuries", {"email": ""}, None),
+]
+
 class InjurySpot(BaseModel):
     """
     A model representing an injury spot.
@@ -37,13 +48,13 @@ class Injury(BaseModel):
 
 # Route to create a new injury
 @router.post('/injuries')
-async def post_injury(injury: Injury, user=Depends(verify_jwt), db=Depends(get_db)):
+async def post_injury(injury: Injury, user=Depends(verify_jwt), db=Depends(get_db), cache=Depends(get_response_cache)):
     """
     Create a new injury.
 
     Args:
         injury (Injury): The injury to create.
-        user (dict): The authenticated user.
+        user (CurrentUser): The authenticated user.
         db (Database): The database connection.
 
     Returns:
@@ -51,16 +62,14 @@ async def post_injury(injury: Injury, user=Depends(verify_jwt), db=Depends(get_d
     """
     collection = db["injuries"]
     injury = injury.dict()
-    injury["email"] = user["email"]
+    injury["email"] = user.email
     injury["created_at"] = datetime.now()
+    # Spots are embedded in the injury so creating one is a single write
+    injury["injury_spots"] = [dict(injury["location"])]
     result = await collection.insert_one(injury)
-    injury_id = str(result.inserted_id)
-    injury_spot_collection = db["injury_spots"]
-    injury_spot_data = injury["location"]
-    injury_spot_data["injury_id"] = injury_id
-    await injury_spot_collection.insert_one(injury_spot_data)
+    await cache.invalidate(injuries_namespace(user.email))
 
-    return {"id": injury_id}
+    return {"id": str(result.inserted_id)}
 
 # Route to get all injuries
 @router.get("/injuries")
@@ -70,62 +79,69 @@ async def get_injuries(db=Depends(get_db), user=Depends(verify_jwt)):
 
     Args:
         db (Database): The database connection.
-        user (dict): The authenticated user.
+        user (CurrentUser): The authenticated user.
 
     Returns:
         list: A list of injuries.
     """
     collection = db["injuries"]
     injuries = []
-    async for injury in collection.find({"email": user["email"]}):
-        injuries.append(fix_object_id(injury))
-        injury_spots = db["injury_spots"].find({"injury_id": str(injury["_id"])})
-        injury["injury_spots"] = []
-        async for spot in injury_spots:
-            injury["injury_spots"].append(fix_object_id(spot))
-    return injuries
+    async for injury in collection.find({"email": user.email}):
+        spots = injury.get("injury_spots") or [injury["location"]]
+        injury["injury_spots"] = [dict(spot, injury_id=injury["_id"]) for spot in spots]
+        injuries.append(injury)
+    return BSONJSONResponse(injuries)
 
 
 # Route to update an injury
 @router.put('/injuries/{injury_id}')
-async def update_injury(injury_id: str, injury: Injury, user=Depends(verify_jwt), db=Depends(get_db)):
+async def update_injury(injury_id: str, injury: Injury, user=Depends(verify_jwt), db=Depends(get_db),
+                        cache=Depends(get_response_cache)):
     """
     Update an existing injury.
 
     Args:
         injury_id (str): The ID of the injury to update.
         injury (Injury): The updated injury.
-        user (dict): The authenticated user.
+        user (CurrentUser): The authenticated user.
         db (Database): The database connection.
 
     Returns:
         dict: A dictionary containing a success message.
     """
+    if not ObjectId.is_valid(injury_id):
+        raise HTTPException(status_code=404, detail="Injury not found")
     collection = db["injuries"]
     injury = injury.dict()
-    injury["email"] = user["email"]
-    result = await collection.update_one({"_id": injury_id, "email": user["email"]}, {"$set": injury})
+    injury["email"] = user.email
+    injury["injury_spots"] = [dict(injury["location"])]
+    result = await collection.update_one({"_id": ObjectId(injury_id), "email": user.email}, {"$set": injury})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Injury not found")
+    await cache.invalidate(injuries_namespace(user.email))
     return {"message": "Injury updated successfully"}
 
 
 # Route to delete an injury
 @router.delete('/injuries/{injury_id}')
-async def delete_injury(injury_id: str, user=Depends(verify_jwt), db=Depends(get_db)):
+async def delete_injury(injury_id: str, user=Depends(verify_jwt), db=Depends(get_db),
+                        cache=Depends(get_response_cache)):
     """
     Delete an existing injury.
 
     Args:
         injury_id (str): The ID of the injury to delete.
-        user (dict): The authenticated user.
+        user (CurrentUser): The authenticated user.
         db (Database): The database connection.
 
     Returns:
         dict: A dictionary containing a success message.
     """
+    if not ObjectId.is_valid(injury_id):
+        raise HTTPException(status_code=404, detail="Injury not found")
     collection = db["injuries"]
-    result = await collection.delete_one({"_id": injury_id, "email": user["email"]})
+    result = await collection.delete_one({"_id": ObjectId(injury_id), "email": user.email})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Injury not found")
+    await cache.invalidate(injuries_namespace(user.email))
     return {"message": "Injury deleted successfully"}
@@ -1,119 +1,258 @@
 from fastapi import APIRouter, Depends
-from .temp import fix_object_id, Player, verify_jwt
-from datetime import datetime, timedelta
+from .temp import Player, verify_jwt, date_range_query
+from .. import bulk_entries, leaderboard, rollups
+from ..days import day_key, utc_now
+from ..db import get_db, get_analytics_db
+from ..pagination import clamp_limit, decode_cursor, paginate
+from ..responses import BSONJSONResponse
+from ..response_cache import get_response_cache, user_namespace, LEADERBOARD
+from ..timeseries import load_series, DEFAULT_POINTS
 
 from starlette.requests import Request
-from pydantic import BaseModel
+from starlette.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
 from bson import ObjectId
-from typing import Optional
+from typing import List, Literal, Optional
+import asyncio
 from datetime import datetime
-from fastapi import HTTPException
+from fastapi import HTTPException, Header
+from pymongo import IndexModel, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 class Suggestion(BaseModel):
     suggestion: str
 
 
-def get_db(request: Request):
-    db = request.app.state.client["TestDB"]
-    return db
+
+class Entry(BaseModel):
+    id: str = Field(alias="_id")
+    position: Optional[str]
+    goals: Optional[int]
+    assists: Optional[int]
+    created_at: Optional[datetime]
+    day: Optional[str]
+    email: Optional[str]
+
 
 router = APIRouter()
 
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+ENTRY_FIELDS = ("position", "goals", "assists", "created_at", "day", "email")
+DEFAULT_ENTRY_FIELDS = ("position", "goals", "assists", "created_at")
+
+indexes = {
+    "entries": [
+        IndexModel([("email", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        # Partial, so entries written before ``day`` existed do not collide on (email, null)
+        IndexModel([("email", ASCENDING), ("day", ASCENDING)], unique=True,
+                   partialFilterExpression={"day": {"$exists": True}}),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=IDEMPOTENCY_KEY_TTL),
+    ],
+}
+query_shapes = [
+    ("entries", {"email": "", "created_at": {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 1, 2)}},
+     [("created_at", -1)]),
+    ("entries", {"email": {"$in": [""]}}, None),
+    ("entries", {"created_at": {"$gte": datetime(2024, 1, 1)}}, None),
+    ("entries", {}, [("created_at", -1)]),
+    ("entries", {"email": "", "day": ""}, None),
+    ("entries", {"$and": [{"email": ""}, {"$or": [{"created_at": {"$lt": datetime(2024, 1, 1)}},
+                                                  {"created_at": datetime(2024, 1, 1), "_id": {"$lt": ObjectId()}}]}]},
+     [("created_at", -1), ("_id", -1)]),
+]
+
+
+def entry_fields(fields):
+    if not fields:
+        return DEFAULT_ENTRY_FIELDS
+    selected = tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown = [field for field in selected if field not in ENTRY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(ENTRY_FIELDS)}")
+    return selected
+
+
+async def record_entry_change(db, cache, email, created_at, goals, assists, games):
+    # Keep the materialized leaderboards and the user's rollup in step with entries
+    await leaderboard.apply_entry_delta(db, email, created_at, goals, assists, games)
+    await rollups.apply_entry_delta(db, email, created_at, goals, assists, games)
+    await cache.invalidate(user_namespace(email), LEADERBOARD)
+
+
+async def upsert_daily_entry(collection, email, player_data):
+    """
+    Write today's entry for email in one round trip.
+
+    The unique (email, day) index makes the upsert safe against concurrent
+    submissions. Returns the entry id and the document it replaced, or None if
+    this was the first entry of the day.
+    """
+    entry_id = ObjectId()
+    try:
+        previous = await collection.find_one_and_update(
+            {"email": email, "day": day_key(player_data["created_at"])},
+            {"$set": player_data, "$setOnInsert": {"_id": entry_id}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted today's entry first; this write now updates it
+        return await upsert_daily_entry(collection, email, player_data)
+    return (previous["_id"] if previous else entry_id), previous
+
 
 @router.post("/entries")
-async def create_player(player: Player, db=Depends(get_db), user=Depends(verify_jwt)):
+async def create_player(player: Player, request: Request, db=Depends(get_db), user=Depends(verify_jwt),
+                        cache=Depends(get_response_cache), idempotency_key: Optional[str] = Header(None)):
+    if idempotency_key:
+        stored = await db["idempotency_keys"].find_one({"_id": f"{user.email}:{idempotency_key}"})
+        if stored:
+            return stored["response"]
+
     collection = db["entries"]
     player_data = player.model_dump()
-    player_data["created_at"] = datetime.now()
-    player_data["email"] = user['email']
-    # Find existing record with the same email and created_at date
-    existing_record = await collection.find_one({
-        "email": user['email'],
-        "created_at": {
-            "$gte": datetime(player_data["created_at"].year, player_data["created_at"].month,
-                             player_data["created_at"].day),
-            "$lt": datetime(player_data["created_at"].year, player_data["created_at"].month,
-                            player_data["created_at"].day) + timedelta(days=1)
-        }
-    })
-    if existing_record:  # Update the existing record
-        await collection.update_one({
-            "_id": existing_record["_id"]
-        }, {
-            "$set": player_data
-        })
-        return {"id": str(existing_record["_id"])}
-    result = await collection.insert_one(player_data)
-    return {"id": str(result.inserted_id)}
+    player_data["created_at"] = utc_now()
+    entry_id, previous = await upsert_daily_entry(collection, user.email, player_data)
+    if previous:  # Updated the existing record
+        await record_entry_change(db, cache, user.email, player_data["created_at"],
+                                  player_data["goals"] - previous["goals"],
+                                  player_data["assists"] - previous["assists"], 0)
+    else:
+        await record_entry_change(db, cache, user.email, player_data["created_at"],
+                                  player_data["goals"], player_data["assists"], 1)
+    player_data["_id"] = entry_id
+    player_data["email"] = user.email
+    await request.app.state.latest_entries.publish(player_data)
+
+    response = {"id": str(entry_id)}
+    if idempotency_key:
+        try:
+            await db["idempotency_keys"].insert_one({
+                "_id": f"{user.email}:{idempotency_key}",
+                "response": response,
+                "created_at": player_data["created_at"]
+            })
+        except DuplicateKeyError:
+            pass
+    return response
 
 
 # Delete a player record
 @router.delete("/entries/{player_id}")
-async def delete_player(player_id: str, db=Depends(get_db), user=Depends(verify_jwt)):
+async def delete_player(player_id: str, request: Request, db=Depends(get_db), user=Depends(verify_jwt),
+                        cache=Depends(get_response_cache)):
     collection = db["entries"]
-    result = await collection.delete_one({
+    deleted = await collection.find_one_and_delete({
         "_id": ObjectId(player_id),
-        "email": user['email']
+        "email": user.email
     })
-    if result.deleted_count == 1:
+    if deleted:
+        await record_entry_change(db, cache, user.email, deleted["created_at"],
+                                  -deleted["goals"], -deleted["assists"], -1)
+        await request.app.state.latest_entries.unpublish(deleted["_id"])
         return {"message": "Entry deleted successfully"}
     return {"message": "Entry not found"}
 
 
-@router.get("/players")
-async def get_players(db=Depends(get_db), user=Depends(verify_jwt),start_date: Optional[str] = None, end_date: Optional[str] = None):
-    collection = db["entries"]
-    players = []
-    query = {
-        "email": user['email']
-    }
-    if start_date and end_date:
-        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-        query["created_at"] = {
-            "$gte": start_date_obj,
-            "$lt": end_date_obj
-        }
-    result = await collection.find(query).sort("created_at", -1).to_list(length=100)
-    for player in result:
-        players.append(fix_object_id(player))
-    return players
-
-
-@router.get("/visualize/") 
-async def visualize(db=Depends(get_db), current_user=Depends(verify_jwt), start_date: Optional[str] = None, end_date: Optional[str] = None):
-    collection = db["entries"]
-    query = {
-        "email": current_user['email']
-    }
-    if start_date and end_date:
-        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-        query["created_at"] = {
-            "$gte": start_date_obj,
-            "$lt": end_date_obj
-        }
-    player_records = await collection.find(query).sort("created_at", 1).to_list(length=100)
-
-    if len(player_records) < 2:
+@router.post("/entries/import")
+async def import_entries(request: Request, db=Depends(get_db), user=Depends(verify_jwt),
+                         cache=Depends(get_response_cache)):
+    """
+    Import many entries from an NDJSON or CSV body (see app.bulk_entries).
+
+    The body is parsed as it arrives, so uploads of any size use bounded memory.
+    """
+    fmt = bulk_entries.import_format(request.headers.get("content-type"))
+    return await bulk_entries.import_entries(db, cache, user.email, request.stream(), fmt)
+
+
+@router.get("/entries/export")
+async def export_entries(db=Depends(get_analytics_db), user=Depends(verify_jwt), format: Literal['ndjson', 'csv'] = 'ndjson',
+                         start_date: Optional[str] = None, end_date: Optional[str] = None):
+    query = date_range_query(start_date, end_date)
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        bulk_entries.export_entries(db, user.email, query, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="entries.{format}"'}
+    )
+
+
+@router.get("/players", response_model=List[Entry])
+async def get_players(
+    response: Response,
+    db=Depends(get_db),
+    user=Depends(verify_jwt),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None
+):
+    """
+    List the user's entries, newest first, a page at a time.
+
+    Pages are keyset ranges on (created_at, _id); pass X-Next-Cursor back as
+    cursor for the next one. fields is a comma-separated subset of
+    ENTRY_FIELDS; _id is always included.
+    """
+    limit = clamp_limit(limit, MAX_PAGE_SIZE)
+    selected = entry_fields(fields)
+    query = {"email": user.email, **date_range_query(start_date, end_date)}
+    if cursor:
+        last = decode_cursor(cursor)
+        after = {"$or": [
+            {"created_at": {"$lt": last.get("created_at")}},
+            {"created_at": last.get("created_at"), "_id": {"$lt": last.get("_id")}}
+        ]}
+        query = {"$and": [query, after]}
+    projection = {field: 1 for field in selected + ("created_at",)}
+    rows = await db["entries"].find(query, projection).sort([("created_at", -1), ("_id", -1)]).to_list(length=limit + 1)
+    rows = paginate(rows, limit, response, ["created_at", "_id"])
+    if "created_at" not in selected:
+        for row in rows:
+            del row["created_at"]
+    return BSONJSONResponse(rows, headers=response.headers)
+
+
+@router.get("/visualize/")
+async def visualize(
+    db=Depends(get_analytics_db),
+    current_user=Depends(verify_jwt),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    bucket: Literal['day', 'week', 'month'] = 'day',
+    series: Literal['raw', 'cumulative', 'rolling'] = 'raw',
+    window: int = 7,
+    points: int = DEFAULT_POINTS
+):
+    query = date_range_query(start_date, end_date)
+    player_series = (await load_series(db, [current_user.email], bucket, query, series, window, points))[current_user.email]
+
+    if len(player_series["dates"]) < 2:
         return "No records found for this player"
 
-    # Create a list of goals and assists
-    goals = [record["goals"] for record in player_records]
-    assists = [record["assists"] for record in player_records]
-    dates = [record["created_at"].isoformat() for record in player_records]
-    return {"dates": dates, "goals": goals, "assists": assists}
+    return player_series
 
 
 @router.post('/suggestions')
 async def create_suggestion(suggestion: Suggestion, user=Depends(verify_jwt), db=Depends(get_db)):
     collection = db["suggestions"]
     suggestion_data = suggestion.dict()
-    suggestion_data["email"] = user['email']
+    suggestion_data["email"] = user.email
     result = await collection.insert_one(suggestion_data)
     return {"id": str(result.inserted_id)}
 
 @router.get("/profile")
 async def get_profile(user=Depends(verify_jwt), db=Depends(get_db)):
-    user = await db["users"].find_one({"email": user["email"]})
-    return fix_object_id(user)
+    profile, stats = await asyncio.gather(
+        db["users"].find_one({"email": user.email}),
+        rollups.get_stats(db, user.email)
+    )
+    profile["stats"] = stats
+    return BSONJSONResponse(profile)
 
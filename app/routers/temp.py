@@ -1,17 +1,14 @@
 import os
 from pydantic import BaseModel
-import geocoder
 from typing import Optional
-import jwt
-from jose import JWTError
+from datetime import datetime, timedelta
+from fastapi import HTTPException
 from dotenv import load_dotenv
-from fastapi import HTTPException , Header
 from starlette.requests import Request
 from fastapi.security import OAuth2PasswordBearer
+from ..tokens import verify_jwt
 load_dotenv()
 maps_api_key=os.getenv('MAPS_API_KEY')
-secret_key=os.getenv('SECRET_KEY')
-algorithm="HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -20,7 +17,24 @@ def fix_object_id(doc):
         doc["_id"] = str(doc["_id"])
     return doc
 
+def date_range_query(start_date: Optional[str], end_date: Optional[str]):
+    """Build the created_at filter for optional YYYY-MM-DD start/end dates, both inclusive."""
+    if not (start_date and end_date):
+        return {}
+    try:
+        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
+        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    return {
+        "created_at": {
+            "$gte": start_date_obj,
+            "$lt": end_date_obj
+        }
+    }
+
 def get_lat_long():
+    import geocoder  # Heavy (pulls in requests) and only needed here
     g=geocoder.ip('me')
     return g.latlng
 
@@ -28,24 +42,6 @@ def get_current_user(request: Request):
     user = request.session.get('user')
     return user
 
-def verify_jwt(authorization: Optional[str] = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=403, detail='Authorization header is missing')
-    
-    scheme, _, token = authorization.partition(' ')
-    
-    if scheme.lower() != 'bearer':
-        raise HTTPException(status_code=401, detail='Invalid authorization scheme')
-    
-    if not token:
-        raise HTTPException(status_code=403, detail='Token is missing')
-    
-    try:
-        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
-        return payload
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
 class Player(BaseModel):
     position: str
     goals: int
@@ -0,0 +1,123 @@
+"""
+Index provisioning and query-plan checks.
+
+Modules that query MongoDB declare the indexes they rely on in a module-level
+``indexes`` dict (collection name -> list of IndexModel) and the query shapes
+they run in ``query_shapes`` as (collection, filter, sort) tuples. On startup
+every declared index is created; creating an index that already exists is a
+no-op. Each index is created on its own, so one that cannot be built (e.g. a
+unique index over duplicate data that still needs a migration from
+app.migrations) is logged as an error without keeping its siblings from being
+built. With VERIFY_QUERY_PLANS set, startup additionally explains every
+registered shape and fails if any of them would scan a whole collection. The
+same check can be run by hand, and exits non-zero on either problem:
+
+    python -m app.schema [--explain]
+"""
+import asyncio
+import logging
+import os
+import sys
+
+from pymongo.errors import OperationFailure
+
+from . import friend_graph, google_auth, leaderboard, rollups
+from .routers import players, friends, injuries
+
+logger = logging.getLogger(__name__)
+
+MODULES = [friend_graph, google_auth, leaderboard, rollups, players, friends, injuries]
+VERIFY_QUERY_PLANS = os.getenv('VERIFY_QUERY_PLANS', '').lower() in ('1', 'true', 'yes')
+
+
+def declared_indexes():
+    collections = {}
+    for module in MODULES:
+        for collection, models in getattr(module, 'indexes', {}).items():
+            collections.setdefault(collection, []).extend(models)
+    return collections
+
+
+def declared_query_shapes():
+    shapes = []
+    for module in MODULES:
+        shapes.extend(getattr(module, 'query_shapes', []))
+    return shapes
+
+
+async def ensure_indexes(db):
+    """
+    Create every declared index and return the ones that failed as (collection, name, error).
+
+    createIndexes builds all the specs of one call together, so each index gets
+    its own call; they all run at once.
+    """
+    models = [(collection, model) for collection, declared in declared_indexes().items() for model in declared]
+    results = await asyncio.gather(*[
+        db[collection].create_indexes([model]) for collection, model in models
+    ], return_exceptions=True)
+    failures = []
+    for (collection, model), result in zip(models, results):
+        if isinstance(result, OperationFailure):
+            name = model.document['name']
+            logger.error("Creating index %s on %s failed: %s", name, collection, result)
+            failures.append((collection, name, result))
+        elif isinstance(result, BaseException):
+            raise result
+    return failures
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+async def collection_scans(db):
+    """Return the registered query shapes whose winning plan is a COLLSCAN."""
+    scans = []
+    for collection, query, sort in declared_query_shapes():
+        cursor = db[collection].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = (await cursor.explain())['queryPlanner']['winningPlan']
+        if 'COLLSCAN' in _stages(plan):
+            scans.append((collection, query, sort))
+    return scans
+
+
+async def verify_query_plans(db):
+    scans = await collection_scans(db)
+    if scans:
+        raise RuntimeError("Query shapes without a usable index: " + "; ".join(
+            f"{collection} {query} sort={sort}" for collection, query, sort in scans
+        ))
+
+
+async def _main(explain):
+    from .db import DB_NAME, create_client
+
+    client = create_client()
+    db = client[DB_NAME]
+    try:
+        failures = await ensure_indexes(db)
+        for collection, name, error in failures:
+            print(f"FAILED {collection}.{name}: {error}")
+        if not explain:
+            return 1 if failures else 0
+        scans = await collection_scans(db)
+        for collection, query, sort in scans:
+            print(f"COLLSCAN {collection} {query} sort={sort}")
+        print(f"{len(declared_query_shapes())} query shapes checked, {len(scans)} collection scans")
+        return 1 if scans or failures else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main('--explain' in sys.argv[1:])))
@@ -0,0 +1,115 @@
+"""
+Goals/assists time series for the visualize endpoints.
+
+Entries are summed into day, week or month buckets inside MongoDB
+($dateTrunc), so only one row per bucket leaves the database whatever the
+length of a user's history. The bucketed series can be turned into a running
+total or a rolling average and is then downsampled with
+Largest-Triangle-Three-Buckets to at most ``points`` points, which keeps
+the payload bounded while preserving peaks and troughs.
+"""
+BUCKETS = ('day', 'week', 'month')
+SERIES = ('raw', 'cumulative', 'rolling')
+DEFAULT_POINTS = 200
+MAX_POINTS = 1000
+
+
+def series_pipeline(emails, bucket, query=None):
+    return [
+        {'$match': {**(query or {}), 'email': {'$in': list(emails)}}},
+        {'$group': {
+            '_id': {
+                'email': '$email',
+                'date': {'$dateTrunc': {'date': '$created_at', 'unit': bucket, 'startOfWeek': 'monday'}},
+            },
+            'goals': {'$sum': '$goals'},
+            'assists': {'$sum': '$assists'},
+        }},
+        {'$sort': {'_id.date': 1}},
+    ]
+
+
+def cumulative(values):
+    total = 0
+    running = []
+    for value in values:
+        total += value
+        running.append(total)
+    return running
+
+
+def rolling_average(values, window):
+    window = max(window, 1)
+    averages = []
+    total = 0
+    for i, value in enumerate(values):
+        total += value
+        if i >= window:
+            total -= values[i - window]
+        averages.append(round(total / min(i + 1, window), 2))
+    return averages
+
+
+def lttb(xs, ys, threshold):
+    """
+    Return the indices of at most threshold points chosen by
+    Largest-Triangle-Three-Buckets. The first and last points are always kept.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+    indices = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third vertex of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        indices.append(best)
+        a = best
+    indices.append(n - 1)
+    return indices
+
+
+def shape_series(dates, goals, assists, series='raw', window=7, points=DEFAULT_POINTS):
+    if series == 'cumulative':
+        goals, assists = cumulative(goals), cumulative(assists)
+    elif series == 'rolling':
+        goals, assists = rolling_average(goals, window), rolling_average(assists, window)
+
+    keep = lttb([date.timestamp() for date in dates], [g + a for g, a in zip(goals, assists)],
+                max(1, min(points, MAX_POINTS)))
+    return {
+        "dates": [dates[i].isoformat() for i in keep],
+        "goals": [goals[i] for i in keep],
+        "assists": [assists[i] for i in keep],
+    }
+
+
+async def load_series(db, emails, bucket='day', query=None, series='raw', window=7, points=DEFAULT_POINTS):
+    """
+    Fetch the bucketed series of every user in emails with a single aggregation.
+
+    Returns {email: {"dates": [...], "goals": [...], "assists": [...]}}; users
+    without entries get empty lists.
+    """
+    raw = {email: ([], [], []) for email in emails}
+    async for row in db["entries"].aggregate(series_pipeline(emails, bucket, query)):
+        dates, goals, assists = raw[row['_id']['email']]
+        dates.append(row['_id']['date'])
+        goals.append(row['goals'])
+        assists.append(row['assists'])
+    return {email: shape_series(*columns, series=series, window=window, points=points)
+            for email, columns in raw.items()}
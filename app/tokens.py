@@ -0,0 +1,82 @@
+"""
+Access tokens issued after Google sign-in.
+
+Tokens are HS256 JWTs carrying the user's email plus iat/exp claims. Verified
+tokens are remembered in a bounded LRU keyed by the SHA-256 digest of the
+token, so repeat requests skip signature verification until the token
+expires.
+"""
+import hashlib
+import os
+import time
+from typing import Optional
+
+import jwt
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from fastapi import HTTPException, Header
+
+load_dotenv()
+secret_key = os.getenv('SECRET_KEY')
+algorithm = "HS256"
+TOKEN_TTL = int(os.getenv('ACCESS_TOKEN_TTL', 30 * 24 * 3600))
+CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+_verified = LRUCache(maxsize=CACHE_SIZE)
+
+
+class CurrentUser:
+    __slots__ = ('email', 'expires_at')
+
+    def __init__(self, email: str, expires_at: float):
+        self.email = email
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"CurrentUser(email={self.email!r})"
+
+
+def create_access_token(email: str, ttl: int = TOKEN_TTL) -> str:
+    now = int(time.time())
+    return jwt.encode({'email': email, 'iat': now, 'exp': now + ttl}, secret_key, algorithm=algorithm)
+
+
+def decode_access_token(token: str) -> CurrentUser:
+    digest = hashlib.sha256(token.encode()).digest()
+    user = _verified.get(digest)
+    if user is not None and user.expires_at > time.time():
+        return user
+    try:
+        payload = jwt.decode(token, secret_key, algorithms=[algorithm], options={'require': ['exp', 'email']})
+    except jwt.PyJWTError:
+        _verified.pop(digest, None)
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user = CurrentUser(payload['email'], payload['exp'])
+    _verified[digest] = user
+    return user
+
+
+def email_from_authorization(authorization: Optional[str]) -> Optional[str]:
+    """Return the email of a valid bearer token, or None; for middleware that must not fail the request."""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return decode_access_token(token).email
+    except HTTPException:
+        return None
+
+
+async def verify_jwt(authorization: Optional[str] = Header(None)) -> CurrentUser:
+    if not authorization:
+        raise HTTPException(status_code=403, detail='Authorization header is missing')
+
+    scheme, _, token = authorization.partition(' ')
+
+    if scheme.lower() != 'bearer':
+        raise HTTPException(status_code=401, detail='Invalid authorization scheme')
+
+    if not token:
+        raise HTTPException(status_code=403, detail='Token is missing')
+
+    return decode_access_token(token)
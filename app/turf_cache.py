@@ -0,0 +1,104 @@
+"""
+Geo-cell cache for Places turf searches.
+
+Request coordinates are quantized to a geohash cell (precision 6 is roughly
+1.2 km x 0.6 km) and Places is queried once per cell, centred on the cell,
+instead of once per request. Results are kept in a bounded LRU with a TTL.
+Concurrent misses for the same cell share a single upstream call.
+"""
+import asyncio
+import os
+
+from cachetools import TTLCache
+from starlette.requests import Request
+
+PRECISION = int(os.getenv('TURF_CACHE_PRECISION', 6))
+TTL = float(os.getenv('TURF_CACHE_TTL', 24 * 3600))
+MAX_CELLS = int(os.getenv('TURF_CACHE_SIZE', 10000))
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def _bounds(lat, lon, precision):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    cell = []
+    even = True
+    bits = value = 0
+    while len(cell) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            cell.append(BASE32[value])
+            bits = value = 0
+    return ''.join(cell), lat_range, lon_range
+
+
+def geohash(lat, lon, precision=PRECISION):
+    return _bounds(lat, lon, precision)[0]
+
+
+def cell_center(lat, lon, precision=PRECISION):
+    _, lat_range, lon_range = _bounds(lat, lon, precision)
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+class TurfCache:
+    def __init__(self, precision=PRECISION, ttl=TTL, max_cells=MAX_CELLS):
+        self.precision = precision
+        self.places = TTLCache(maxsize=max_cells, ttl=ttl)
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def _load(self, cell, center, fetch):
+        try:
+            places = await fetch(*center)
+            self.places[cell] = places
+            return places
+        finally:
+            self.inflight.pop(cell, None)
+
+    async def get(self, lat, lon, fetch):
+        """
+        Return the places for the cell containing (lat, lon).
+
+        On a miss fetch(center_lat, center_lon) is awaited once for the cell;
+        its result is cached and handed to every request that arrived while
+        it was in flight. Failures are not cached.
+        """
+        cell = geohash(lat, lon, self.precision)
+        places = self.places.get(cell)
+        if places is not None:
+            self.hits += 1
+            return places
+        task = self.inflight.get(cell)
+        if task is None:
+            self.misses += 1
+            center = cell_center(lat, lon, self.precision)
+            task = self.inflight[cell] = asyncio.ensure_future(self._load(cell, center, fetch))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'cells': len(self.places),
+            'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+def get_turf_cache(request: Request):
+    return request.app.state.turf_cache
@@ -0,0 +1,192 @@
+"""
+Local index of turfs already seen in Places results.
+
+Turf coordinates are kept in flat NumPy arrays sorted by a fixed lat/lon grid
+cell, so a radius query only measures the turfs in the grid cells overlapping
+the search circle, using a vectorized haversine. Turfs added since the last
+merge sit in a small unsorted tail that is scanned linearly and folded into
+the sorted arrays once it grows past MERGE_THRESHOLD. The index is loaded from
+TURF_INDEX_PATH by the first request that needs it and saved there on shutdown.
+"""
+import math
+import os
+
+from starlette.requests import Request
+
+from .lazy import lazy_module
+
+np = lazy_module('numpy')
+
+INDEX_PATH = os.getenv('TURF_INDEX_PATH', 'turf_index.npz')
+EARTH_RADIUS_KM = 6371.0
+CELL_DEG = 0.05
+LON_CELLS = int(round(360 / CELL_DEG))
+MERGE_THRESHOLD = 1024
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Distance in km from (lat, lon) to every point in lats/lons, all in degrees."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def cell_ids(lats, lons):
+    rows = np.floor((np.asarray(lats) + 90) / CELL_DEG).astype(np.int64)
+    cols = np.floor((np.asarray(lons) + 180) / CELL_DEG).astype(np.int64) % LON_CELLS
+    return rows * LON_CELLS + cols
+
+
+def _place_key(place):
+    return place.get('googleMapsUri') or '{}:{}:{}'.format(
+        place.get('displayName', {}).get('text'), place['location']['latitude'], place['location']['longitude']
+    )
+
+
+class TurfIndex:
+    def __init__(self, lats=(), lons=(), names=(), uris=()):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.names = list(names)
+        self.uris = list(uris)
+        self.cells = np.empty(0, dtype=np.int64)
+        self.tail = []
+        self.keys = set(self.uris)
+        self.dirty = False
+        self._sort()
+
+    def __len__(self):
+        return len(self.names) + len(self.tail)
+
+    def _sort(self):
+        cells = cell_ids(self.lats, self.lons)
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.lats = self.lats[order]
+        self.lons = self.lons[order]
+        self.names = [self.names[i] for i in order]
+        self.uris = [self.uris[i] for i in order]
+
+    def _merge(self):
+        if not self.tail:
+            return
+        lats, lons, names, uris = zip(*self.tail)
+        self.lats = np.concatenate([self.lats, lats])
+        self.lons = np.concatenate([self.lons, lons])
+        self.names.extend(names)
+        self.uris.extend(uris)
+        self.tail = []
+        self._sort()
+
+    def add(self, places):
+        for place in places:
+            key = _place_key(place)
+            if key in self.keys:
+                continue
+            self.keys.add(key)
+            self.tail.append((
+                place['location']['latitude'],
+                place['location']['longitude'],
+                place.get('displayName', {}).get('text', ''),
+                key,
+            ))
+            self.dirty = True
+        if len(self.tail) >= MERGE_THRESHOLD:
+            self._merge()
+
+    def _candidates(self, lat, lon, radius_km):
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        first_row = int(math.floor((max(lat - dlat, -90.0) + 90) / CELL_DEG))
+        last_row = int(math.floor((min(lat + dlat, 90.0) + 90) / CELL_DEG))
+        widest = min(abs(lat) + dlat, 89.9)
+        dlon = dlat / math.cos(math.radians(widest))
+        if dlon >= 180:
+            col_ranges = [(0, LON_CELLS - 1)]
+        else:
+            first_col = int(math.floor((lon - dlon + 180) / CELL_DEG))
+            last_col = int(math.floor((lon + dlon + 180) / CELL_DEG))
+            if first_col < 0:
+                col_ranges = [(first_col % LON_CELLS, LON_CELLS - 1), (0, last_col)]
+            elif last_col >= LON_CELLS:
+                col_ranges = [(first_col, LON_CELLS - 1), (0, last_col % LON_CELLS)]
+            else:
+                col_ranges = [(first_col, last_col)]
+
+        starts, stops = [], []
+        for row in range(first_row, last_row + 1):
+            for first_col, last_col in col_ranges:
+                starts.append(row * LON_CELLS + first_col)
+                stops.append(row * LON_CELLS + last_col)
+        lo = np.searchsorted(self.cells, starts, side='left')
+        hi = np.searchsorted(self.cells, stops, side='right')
+        spans = [np.arange(a, b) for a, b in zip(lo, hi) if b > a]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def query(self, lat, lon, k=5, radius_km=None):
+        """
+        Return up to k turfs nearest to (lat, lon), closest first.
+
+        With radius_km only turfs within that distance are considered and only
+        the grid cells overlapping the circle are scanned; without it every
+        turf is measured.
+        """
+        if radius_km is None:
+            candidates = np.arange(len(self.names))
+        else:
+            candidates = self._candidates(lat, lon, radius_km)
+        lats = self.lats[candidates]
+        lons = self.lons[candidates]
+        if self.tail:
+            tail = np.array([(t[0], t[1]) for t in self.tail], dtype=np.float64)
+            lats = np.concatenate([lats, tail[:, 0]])
+            lons = np.concatenate([lons, tail[:, 1]])
+        if not len(lats):
+            return []
+
+        distances = haversine_km(lat, lon, lats, lons)
+        if radius_km is not None:
+            within = np.nonzero(distances <= radius_km)[0]
+        else:
+            within = np.arange(len(distances))
+        if len(within) > k:
+            within = within[np.argpartition(distances[within], k - 1)[:k]]
+        within = within[np.argsort(distances[within], kind='stable')]
+
+        results = []
+        for position in within:
+            if position < len(candidates):
+                i = candidates[position]
+                name, uri = self.names[i], self.uris[i]
+                place_lat, place_lon = self.lats[i], self.lons[i]
+            else:
+                place_lat, place_lon, name, uri = self.tail[position - len(candidates)]
+            results.append({
+                'displayName': {'text': name},
+                'location': {'latitude': float(place_lat), 'longitude': float(place_lon)},
+                'googleMapsUri': uri,
+                'distance_km': round(float(distances[position]), 2),
+            })
+        return results
+
+    def save(self, path=INDEX_PATH):
+        self._merge()
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, lats=self.lats, lons=self.lons,
+                 names=np.array(self.names, dtype=np.str_), uris=np.array(self.uris, dtype=np.str_))
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            return cls(data['lats'], data['lons'], data['names'].tolist(), data['uris'].tolist())
+
+
+def get_turf_index(request: Request):
+    state = request.app.state
+    if state.turf_index is None:
+        state.turf_index = TurfIndex.load()
+    return state.turf_index
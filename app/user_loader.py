@@ -0,0 +1,53 @@
+"""
+Batched user profile loading.
+
+A ``UserLoader`` lives for one request. Every ``load`` issued in the same
+event loop tick is coalesced into a single ``$in`` query on ``users`` that
+fetches only the public profile fields, and repeated loads of an email reuse
+the first result.
+"""
+import asyncio
+
+from starlette.requests import Request
+
+PROFILE_FIELDS = {'_id': 0, 'email': 1, 'name': 1, 'profile_pic_url': 1}
+
+
+class UserLoader:
+    def __init__(self, db):
+        self.db = db
+        self.loaded = {}
+        self.pending = []
+
+    def load(self, email):
+        """Return a future resolving to the profile for email, or None if there is no such user."""
+        future = self.loaded.get(email)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.loaded[email] = loop.create_future()
+            self.pending.append(email)
+            if len(self.pending) == 1:
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return future
+
+    async def load_many(self, emails):
+        return await asyncio.gather(*[self.load(email) for email in emails])
+
+    async def _dispatch(self):
+        emails, self.pending = self.pending, []
+        try:
+            found = {}
+            async for user in self.db["users"].find({'email': {'$in': emails}}, PROFILE_FIELDS):
+                found[user['email']] = user
+        except Exception as exc:
+            for email in emails:
+                if not self.loaded[email].done():
+                    self.loaded[email].set_exception(exc)
+            return
+        for email in emails:
+            if not self.loaded[email].done():
+                self.loaded[email].set_result(found.get(email))
+
+
+def get_user_loader(request: Request):
+    return UserLoader(request.app.state.db)
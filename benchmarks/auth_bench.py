@@ -0,0 +1,43 @@
+"""
+Micro-benchmark of per-request auth overhead.
+
+"before" decodes and verifies the JWT on every call, as verify_jwt used to;
+"after" goes through the current verify_jwt with its verified-token cache.
+
+    python -m benchmarks.auth_bench --iterations 100000
+"""
+import argparse
+import asyncio
+import time
+
+import jwt
+
+from app import tokens
+
+
+def before(authorization):
+    _, _, token = authorization.partition(' ')
+    return jwt.decode(token, tokens.secret_key, algorithms=[tokens.algorithm])
+
+
+async def main(args):
+    tokens.secret_key = tokens.secret_key or 'benchmark-secret'
+    authorization = 'Bearer ' + tokens.create_access_token('player@example.com')
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        before(authorization)
+    old = (time.perf_counter() - start) / args.iterations
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        await tokens.verify_jwt(authorization)
+    new = (time.perf_counter() - start) / args.iterations
+
+    print(f"before {old * 1e6:7.2f} us/request  after {new * 1e6:7.2f} us/request  speedup {old / new:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=100000)
+    asyncio.run(main(parser.parse_args()))
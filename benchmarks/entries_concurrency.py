@@ -0,0 +1,88 @@
+"""
+Fire concurrent POST /entries for one user and check nothing is double counted.
+
+--requests submissions with random goals/assists are sent at once for the same
+user and day. Afterwards exactly one entry must exist, and the materialized
+weekly leaderboard and the user's rollup must both count a single game whose
+totals match the surviving entry. --idempotent sends every request with the
+same Idempotency-Key. Needs a reachable MongoDB (MONGO_URI, defaults to a
+local mongod); a throwaway database is used and dropped afterwards.
+
+    python -m benchmarks.entries_concurrency --requests 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+BENCH_DB = "EntriesConcurrency"
+EMAIL = 'player@example.com'
+
+
+async def main(args):
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    from app import leaderboard, rollups
+    from app.latest_entries import LatestEntries
+    from app.main import app
+    from app.response_cache import ResponseCache
+    from app.routers.players import get_db, indexes
+    from app.tokens import create_access_token
+
+    mongo = AsyncIOMotorClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    db = mongo[BENCH_DB]
+    for collection, models in indexes.items():
+        await db[collection].create_indexes(models)
+    for period in leaderboard.PERIOD_DAYS:
+        await leaderboard.rebuild(db, period)
+    app.dependency_overrides[get_db] = lambda: db
+    app.state.latest_entries = LatestEntries(db)
+    app.state.response_cache = ResponseCache()
+
+    headers = {'Authorization': f'Bearer {create_access_token(EMAIL)}'}
+    if args.idempotent:
+        headers['Idempotency-Key'] = 'bench'
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://app', headers=headers) as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                client.post('/entries', json={
+                    'position': 'ST', 'goals': random.randint(0, 5), 'assists': random.randint(0, 5)
+                })
+                for _ in range(args.requests)
+            ])
+            elapsed = time.perf_counter() - start
+
+        entries = await db["entries"].find({'email': EMAIL}).to_list(length=None)
+        row = await db["leaderboards"].find_one({'period': 'weekly', 'email': EMAIL})
+        stats = await rollups.get_stats(db, EMAIL)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        await mongo.drop_database(BENCH_DB)
+        mongo.close()
+
+    failed = sum(response.status_code != 200 for response in responses)
+    ids = {response.json().get('id') for response in responses if response.status_code == 200}
+    print(f"{args.requests} submissions in {elapsed:.2f} s, {failed} failed, {len(ids)} distinct ids")
+    problems = []
+    if len(entries) != 1:
+        problems.append(f"expected 1 entry, found {len(entries)}")
+    elif row is None or (row['games'], row['goals'], row['assists']) != (1, entries[0]['goals'], entries[0]['assists']):
+        problems.append(f"leaderboard row {row} does not match entry {entries[0]}")
+    elif stats['lifetime']['games'] != 1 or stats['lifetime']['goals'] != entries[0]['goals']:
+        problems.append(f"rollup {stats['lifetime']} does not match entry {entries[0]}")
+    for problem in problems:
+        print(problem)
+    return 1 if problems or failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--idempotent', action='store_true')
+    sys.exit(asyncio.run(main(parser.parse_args())))
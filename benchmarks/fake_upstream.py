@@ -0,0 +1,52 @@
+"""
+Minimal keep-alive HTTP/1.1 server used to stand in for Google and
+football-data.org in benchmarks. Every request is answered with the same JSON
+body after a fixed delay, which makes serialized vs concurrent handling easy
+to tell apart.
+"""
+import asyncio
+import json
+
+
+class FakeUpstream:
+    def __init__(self, body, delay=0.2, status=200):
+        self.body = json.dumps(body).encode()
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+                writer.write(
+                    f"HTTP/1.1 {self.status} OK\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(self.body)}\r\n\r\n".encode() + self.body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
@@ -0,0 +1,82 @@
+"""
+Friendship-check latency: the old two-branch $or over ``friendships`` vs an
+edge probe on ``friend_edges`` vs the in-process friend-set cache.
+
+Seeds --users users with --friends random friends each, in both layouts.
+Needs a reachable MongoDB (MONGO_URI, defaults to a local mongod).
+
+    python -m benchmarks.friendship_bench --users 10000 --friends 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.friend_graph import FriendSets, backfill, indexes
+
+BENCH_DB = "FriendshipBench"
+
+
+async def seed(db, users, friends):
+    await db["friendships"].create_index([('user1_email', 1), ('user2_email', 1)])
+    await db["friendships"].create_index([('user2_email', 1), ('user1_email', 1)])
+    await db["friend_edges"].create_indexes(indexes["friend_edges"])
+    pairs = set()
+    for user in range(users):
+        for friend in random.sample(range(users), friends):
+            if friend != user:
+                pairs.add((min(user, friend), max(user, friend)))
+    rows = [{'user1_email': f'u{a}', 'user2_email': f'u{b}', 'created_at': datetime.utcnow()} for a, b in pairs]
+    for i in range(0, len(rows), 10000):
+        await db["friendships"].insert_many(rows[i:i + 10000])
+    await backfill(db)
+    return list(pairs)
+
+
+async def timed(check, probes):
+    start = time.perf_counter()
+    for a, b in probes:
+        await check(a, b)
+    return (time.perf_counter() - start) / len(probes)
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    db = client[BENCH_DB]
+    try:
+        pairs = await seed(db, args.users, args.friends)
+        probes = [(f'u{a}', f'u{b}') for a, b in random.sample(pairs, args.probes)]
+        cache = FriendSets(ttl=3600)
+
+        async def old(a, b):
+            return await db["friendships"].find_one({'$or': [
+                {'user1_email': a, 'user2_email': b},
+                {'user1_email': b, 'user2_email': a}
+            ]})
+
+        async def edge(a, b):
+            return await db["friend_edges"].find_one({'user_email': a, 'friend_email': b})
+
+        results = {
+            '$or on friendships': await timed(old, probes),
+            'friend_edges probe': await timed(edge, probes),
+            'cached friend set (cold)': await timed(lambda a, b: cache.are_friends(db, a, b), probes),
+            'cached friend set (warm)': await timed(lambda a, b: cache.are_friends(db, a, b), probes),
+        }
+        for name, latency in results.items():
+            print(f"{name:<26} {latency * 1e6:9.1f} us/check")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--friends', type=int, default=50)
+    parser.add_argument('--probes', type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,60 @@
+"""
+Load test for the async outbound HTTP layer.
+
+Points /turf_near_me at a local fake Places endpoint that takes --delay
+seconds per call, fires --concurrency requests at the app at once and
+reports the wall time. With blocking calls the requests serialize
+(~concurrency * delay); with the pooled async client they overlap (~delay).
+
+    python -m benchmarks.http_load --concurrency 50 --delay 0.2
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.fake_upstream import FakeUpstream
+
+PLACES = {'places': [{
+    'displayName': {'text': 'Fake Turf'},
+    'location': {'latitude': 12.97, 'longitude': 77.59},
+    'googleMapsUri': 'https://maps.google.com/?cid=1',
+}]}
+
+
+async def main(args):
+    async with FakeUpstream(PLACES, delay=args.delay) as upstream:
+        os.environ['PLACES_SEARCH_URL'] = upstream.url + '/v1/places:searchText'
+        from app.main import app
+        from app.http_client import HttpClient
+        from app.turf_cache import TurfCache
+        from app.turf_index import TurfIndex
+
+        app.state.http = HttpClient()
+        app.state.turf_cache = TurfCache()
+        app.state.turf_index = TurfIndex()
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://app') as client:
+                start = time.perf_counter()
+                responses = await asyncio.gather(*[
+                    # A different geo cell per request so the turf cache cannot absorb them
+                    client.get('/turf_near_me', params={'lat': 12.97 + i * 0.05, 'long': 77.59})
+                    for i in range(args.concurrency)
+                ])
+                elapsed = time.perf_counter() - start
+        finally:
+            await app.state.http.close()
+
+    failed = sum(response.status_code != 200 for response in responses)
+    print(f"{args.concurrency} requests, {upstream.requests} upstream calls, {failed} failed")
+    print(f"wall time {elapsed:.2f} s (serialized would be ~{args.concurrency * args.delay:.2f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
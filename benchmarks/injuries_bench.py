@@ -0,0 +1,77 @@
+"""
+Compare the old per-injury injury_spots lookups with the embedded layout.
+
+For each injury count the same data is written in both layouts, then the old
+N+1 listing and the current single-query listing are timed. Needs a
+reachable MongoDB (MONGO_URI, defaults to a local mongod).
+
+    python -m benchmarks.injuries_bench --counts 10 50 200 1000
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+BENCH_DB = "InjuriesBench"
+EMAIL = "player@example.com"
+
+
+async def seed(db, count):
+    await db["injuries"].drop()
+    await db["injury_spots"].drop()
+    await db["injuries"].create_index("email")
+    await db["injury_spots"].create_index("injury_id")
+    injuries = [
+        {'injury_type': 'sprain', 'duration': 7, 'location': {'x': i, 'y': i}, 'email': EMAIL,
+         'created_at': datetime.now(), 'injury_spots': [{'x': i, 'y': i}]}
+        for i in range(count)
+    ]
+    result = await db["injuries"].insert_many(injuries)
+    await db["injury_spots"].insert_many([
+        {'x': i, 'y': i, 'injury_id': str(injury_id)} for i, injury_id in enumerate(result.inserted_ids)
+    ])
+
+
+async def split_listing(db):
+    injuries = []
+    async for injury in db["injuries"].find({"email": EMAIL}, {'injury_spots': 0}):
+        injuries.append(injury)
+        injury["injury_spots"] = [spot async for spot in db["injury_spots"].find({"injury_id": str(injury["_id"])})]
+    return injuries
+
+
+async def embedded_listing(db):
+    return [injury async for injury in db["injuries"].find({"email": EMAIL})]
+
+
+async def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    db = client[BENCH_DB]
+    try:
+        for count in args.counts:
+            await seed(db, count)
+            old = await timed(lambda: split_listing(db), args.repeat)
+            new = await timed(lambda: embedded_listing(db), args.repeat)
+            print(f"{count:>6} injuries  split {old * 1000:8.1f} ms  embedded {new * 1000:8.1f} ms")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 50, 200, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,89 @@
+"""
+Compare the aggregation leaderboard against the old pandas path.
+
+Seeds a throwaway database with synthetic entries and times both approaches
+for a monthly window. Needs a reachable MongoDB (MONGO_URI, defaults to a
+local mongod):
+
+    python -m benchmarks.leaderboard_bench --sizes 100000 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.leaderboard import get_leaderboard, window_start
+
+BENCH_DB = "LeaderboardBench"
+
+
+async def seed(db, size, users):
+    await db["entries"].drop()
+    await db["users"].drop()
+    await db["users"].insert_many(
+        [{'email': f'user{i}@example.com', 'name': f'User {i}'} for i in range(users)]
+    )
+    now = datetime.now()
+    batch = []
+    for i in range(size):
+        batch.append({
+            'email': f'user{random.randrange(users)}@example.com',
+            'position': 'FW',
+            'goals': random.randint(0, 5),
+            'assists': random.randint(0, 5),
+            'created_at': now - timedelta(minutes=random.randint(0, 60 * 24 * 45)),
+        })
+        if len(batch) == 10000:
+            await db["entries"].insert_many(batch)
+            batch = []
+    if batch:
+        await db["entries"].insert_many(batch)
+    await db["entries"].create_index([('created_at', -1)])
+
+
+async def pandas_leaderboard(db, period):
+    players = []
+    async for player in db["entries"].find({"created_at": {"$gte": window_start(period)}}):
+        player['_id'] = str(player['_id'])
+        players.append(player)
+    df = pd.DataFrame(players)
+    df['G/A'] = df['goals'] + df['assists']
+    df = df.sort_values(by='G/A', ascending=False)
+    return df.to_dict(orient='records')
+
+
+async def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    db = client[BENCH_DB]
+    try:
+        for size in args.sizes:
+            await seed(db, size, args.users)
+            old = await timed(lambda: pandas_leaderboard(db, 'monthly'), args.repeat)
+            new = await timed(lambda: get_leaderboard(db, 'monthly', 0, 20), args.repeat)
+            print(f"{size:>9} entries  pandas {old * 1000:9.1f} ms  "
+                  f"aggregation {new * 1000:9.1f} ms  speedup {old / new:6.1f}x")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 300000, 1000000])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
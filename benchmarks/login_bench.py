@@ -0,0 +1,71 @@
+"""
+Measure /auth/google latency under a burst of sign-ins.
+
+Google's userinfo endpoint is replaced by a local fake that answers after
+--delay seconds. --burst sign-ins are fired at once, spread over --users
+distinct tokens, so the run shows both upstream coalescing and the cost of
+the users upsert. Needs a reachable MongoDB (MONGO_URI, defaults to a local
+mongod); a throwaway database is used and dropped afterwards.
+
+    python -m benchmarks.login_bench --burst 500 --users 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.fake_upstream import FakeUpstream
+
+BENCH_DB = "LoginBench"
+PROFILE = {'email': 'player@example.com', 'name': 'Player', 'picture': 'https://example.com/p.png'}
+
+
+async def sign_in(client, token):
+    start = time.perf_counter()
+    response = await client.post('/auth/google', json={'access_token': token})
+    return time.perf_counter() - start, response.status_code
+
+
+async def main(args):
+    async with FakeUpstream(PROFILE, delay=args.delay) as upstream:
+        os.environ['GOOGLE_USERINFO_URL'] = upstream.url + '/oauth2/v3/userinfo'
+        os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+        from app.main import app
+        from app.http_client import HttpClient
+
+        mongo = AsyncIOMotorClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+        app.state.http = HttpClient()
+        app.state.users = mongo[BENCH_DB]["users"]
+        await app.state.users.create_index('email', unique=True)
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://app') as client:
+                start = time.perf_counter()
+                results = await asyncio.gather(*[
+                    sign_in(client, f'token-{i % args.users}') for i in range(args.burst)
+                ])
+                elapsed = time.perf_counter() - start
+        finally:
+            await app.state.http.close()
+            await mongo.drop_database(BENCH_DB)
+            mongo.close()
+
+    latencies = sorted(latency for latency, _ in results)
+    failed = sum(status != 200 for _, status in results)
+    print(f"{args.burst} sign-ins over {args.users} tokens in {elapsed:.2f} s, "
+          f"{upstream.requests} Google calls, {failed} failed")
+    print(f"p50 {statistics.median(latencies) * 1000:.1f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms  "
+          f"max {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--burst', type=int, default=500)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.1)
+    asyncio.run(main(parser.parse_args()))
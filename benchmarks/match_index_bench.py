@@ -0,0 +1,117 @@
+"""
+Historical match index: build time, cold-load time, resident memory and
+per-lookup latency, against the old approach of scanning the CSVs with pandas.
+
+Uses the given appearances/games CSVs, or generates --rows synthetic
+appearances when none are passed. Artifacts go to a temporary directory.
+
+    python -m benchmarks.match_index_bench --rows 1000000
+    python -m benchmarks.match_index_bench --appearances appearances.csv --games games.csv
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.match_index import MatchIndex, build
+
+
+def write_synthetic(directory, rows, games):
+    appearances_path = os.path.join(directory, 'appearances.csv')
+    games_path = os.path.join(directory, 'games.csv')
+    with open(games_path, 'w') as f:
+        f.write('game_id,home_club_name,away_club_name,date\n')
+        for game in range(games):
+            f.write(f'{game},Club {game % 97},Club {(game + 13) % 97},2015-{game % 12 + 1:02d}-{game % 28 + 1:02d}\n')
+    with open(appearances_path, 'w') as f:
+        f.write('game_id,player_name,date,goals,assists\n')
+        for _ in range(rows):
+            game = random.randrange(games)
+            f.write(f'{game},Player {random.randrange(20000)},{random.randint(2012, 2024)}-{game % 12 + 1:02d}-'
+                    f'{game % 28 + 1:02d},{min(np.random.poisson(0.3), 6)},{min(np.random.poisson(0.2), 5)}\n')
+    return appearances_path, games_path
+
+
+LOAD_PROBE = """
+import resource, sys, time
+from app.match_index import MatchIndex
+rss = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+before = rss()
+start = time.perf_counter()
+index = MatchIndex.load(sys.argv[1])
+index.lookup(1, 1, 0, 0)
+print(time.perf_counter() - start, before, rss())
+"""
+
+
+def cold_load(index_path):
+    """Load the artifact in a fresh interpreter; returns (seconds, max RSS before, after) in MiB."""
+    output = subprocess.run([sys.executable, '-c', LOAD_PROBE, index_path], capture_output=True, text=True,
+                            check=True).stdout
+    return tuple(float(value) for value in output.split())
+
+
+def pandas_lookup(appearances_path, games_path, day, month, goals, assists):
+    """The commented-out implementation this index replaces, minus its .apply."""
+    import pandas as pd
+    df = pd.read_csv(appearances_path)
+    dates = pd.to_datetime(df['date'])
+    df = df[(dates.dt.month == month) & (dates.dt.day == day) & (df['goals'] == goals) & (df['assists'] == assists)]
+    if df.empty:
+        return None
+    games = pd.read_csv(games_path)
+    return games[games['game_id'] == df.iloc[0]['game_id']].iloc[0]
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        if args.appearances:
+            appearances_path, games_path = args.appearances, args.games
+        else:
+            appearances_path, games_path = write_synthetic(directory, args.rows, args.game_count)
+        index_path = os.path.join(directory, 'match_index.npz')
+
+        start = time.perf_counter()
+        keys = build(appearances_path, games_path, index_path)
+        print(f"build: {keys} keys in {time.perf_counter() - start:.2f} s, "
+              f"artifact {os.path.getsize(index_path) / 1024:.0f} KiB")
+
+        elapsed, rss_before, rss_after = cold_load(index_path)
+        index = MatchIndex.load(index_path)
+        print(f"cold load: {elapsed * 1000:.1f} ms, arrays {index.nbytes / 1024:.0f} KiB, "
+              f"process max RSS {rss_before:.1f} -> {rss_after:.1f} MiB")
+
+        probes = [(random.randint(1, 28), random.randint(1, 12), random.randint(0, 3), random.randint(0, 2))
+                  for _ in range(args.lookups)]
+        latencies = []
+        found = 0
+        for probe in probes:
+            start = time.perf_counter()
+            found += index.lookup(*probe) is not None
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"index lookup: p50 {statistics.median(latencies) * 1e6:.1f} us  "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e6:.1f} us  ({found}/{len(probes)} found)")
+
+        if args.pandas:
+            start = time.perf_counter()
+            for probe in probes[:args.pandas]:
+                pandas_lookup(appearances_path, games_path, *probe)
+            print(f"pandas scan: {(time.perf_counter() - start) / args.pandas * 1000:.0f} ms per lookup")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--appearances')
+    parser.add_argument('--games')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--game-count', type=int, default=50000)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--pandas', type=int, default=3, help='lookups to time with the old pandas scan (0 to skip)')
+    main(parser.parse_args())
@@ -0,0 +1,67 @@
+"""
+Serialization throughput for the leaderboard and /players payloads.
+
+Compares the old path (convert _id with fix_object_id, run FastAPI's
+jsonable_encoder, render with the stdlib JSONResponse) against rendering the
+raw documents with BSONJSONResponse. No database is needed.
+
+    python -m benchmarks.serialization_bench --rows 100 --rounds 2000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from app.responses import BSONJSONResponse
+from app.routers.temp import fix_object_id
+
+
+def leaderboard_rows(count):
+    return [{
+        'email': f'player{i}@example.com', 'name': f'Player {i}', 'goals': random.randint(0, 60),
+        'assists': random.randint(0, 60), 'G/A': random.randint(0, 120), 'games': random.randint(1, 30),
+        'rank': i + 1,
+    } for i in range(count)]
+
+
+def player_rows(count):
+    now = datetime(2024, 5, 1)
+    return [{
+        '_id': ObjectId(), 'position': random.choice(['GK', 'DEF', 'MID', 'ST']), 'goals': random.randint(0, 5),
+        'assists': random.randint(0, 5), 'created_at': now - timedelta(days=i),
+    } for i in range(count)]
+
+
+def old_path(rows):
+    return JSONResponse(jsonable_encoder([fix_object_id(dict(row)) for row in rows])).body
+
+
+def new_path(rows):
+    return BSONJSONResponse(rows).body
+
+
+def measure(render, rows, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        body = render(rows)
+    elapsed = time.perf_counter() - start
+    return rounds / elapsed, len(body)
+
+
+def main(args):
+    for name, rows in (('leaderboard', leaderboard_rows(args.rows)), ('/players', player_rows(args.rows))):
+        old_rate, old_size = measure(old_path, rows, args.rounds)
+        new_rate, new_size = measure(new_path, rows, args.rounds)
+        print(f"{name} ({args.rows} rows): jsonable_encoder+json {old_rate:,.0f}/s ({old_size} B), "
+              f"orjson {new_rate:,.0f}/s ({new_size} B), {new_rate / old_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=2000)
+    main(parser.parse_args())
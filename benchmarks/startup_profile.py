@@ -0,0 +1,115 @@
+"""
+Cold-start report and time-to-first-request budget.
+
+Starts a fresh interpreter that imports app.main under ``-X importtime``,
+runs the app's lifespan startup under cProfile until the app reports ready
+and serves one request. Then prints:
+
+- import cost of every app module and of each third-party package
+- startup cost per app module
+- total time to first request
+
+With --budget the script exits non-zero when time to first request goes over
+that many seconds, so CI can run it as a regression check. Startup creates
+indexes, so it needs a reachable MongoDB (MONGO_URI, defaults to a local
+mongod); --import-only skips startup and measures the import alone.
+
+    python -m benchmarks.startup_profile --budget 3
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+CHILD = """
+import asyncio, cProfile, json, os, pstats, sys, time
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017')
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+result = {'import': imported - start, 'startup': 0.0, 'startup_modules': {}}
+if sys.argv[1] != 'import-only':
+    import httpx
+    profile = cProfile.Profile()
+
+    async def first_request():
+        lifespan = main.lifespan(main.app)
+        profile.enable()
+        began = time.perf_counter()
+        await lifespan.__aenter__()
+        result['serving'] = time.perf_counter() - began
+        await main.app.state.startup
+        result['startup'] = time.perf_counter() - began
+        profile.disable()
+        try:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://app') as client:
+                began = time.perf_counter()
+                await client.get('/player_leaderboard/weekly')
+                result['first_request'] = time.perf_counter() - began
+        finally:
+            await lifespan.__aexit__(None, None, None)
+
+    asyncio.run(first_request())
+    root = os.path.dirname(os.path.abspath(main.__file__))
+    for (filename, _, function), (_, _, _, cumulative, _) in pstats.Stats(profile).stats.items():
+        if filename.startswith(root):
+            module = 'app.' + os.path.relpath(filename, root)[:-3].replace(os.sep, '.')
+            modules = result['startup_modules']
+            modules[module] = max(modules.get(module, 0.0), cumulative)
+result['total'] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def import_breakdown(stderr):
+    """Return {module: cumulative seconds} for app modules and top-level third-party packages."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, _, name = match.groups()
+        if not name.startswith('app.') and name != 'app':
+            name = name.split('.')[0]
+        modules[name] = max(modules.get(name, 0.0), int(cumulative) / 1e6)
+    return modules
+
+
+def main(args):
+    mode = 'import-only' if args.import_only else 'full'
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, mode],
+                             capture_output=True, text=True, env={**os.environ})
+    if process.returncode:
+        sys.stderr.write(process.stderr[-4000:])
+        return 2
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+
+    imports = import_breakdown(process.stderr)
+    print(f"import app.main: {result['import'] * 1000:.0f} ms")
+    for name, seconds in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+    if not args.import_only:
+        print(f"lifespan startup: {result['serving'] * 1000:.0f} ms to serving, "
+              f"{result['startup'] * 1000:.0f} ms to ready")
+        for name, seconds in sorted(result['startup_modules'].items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+        print(f"first request: {result['first_request'] * 1000:.0f} ms")
+    print(f"time to first request: {result['total'] * 1000:.0f} ms")
+
+    if args.budget is not None and result['total'] > args.budget:
+        print(f"over budget: {result['total']:.2f} s > {args.budget:.2f} s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, help='fail when time to first request exceeds this many seconds')
+    parser.add_argument('--import-only', action='store_true')
+    parser.add_argument('--top', type=int, default=15)
+    sys.exit(main(parser.parse_args()))
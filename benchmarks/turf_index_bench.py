@@ -0,0 +1,52 @@
+"""
+Benchmark TurfIndex queries against the scalar calculate_distance scan.
+
+Builds indexes of 10^4 to 10^6 random turfs over a country-sized box and
+times a 5-nearest query within 2.5 km, an unbounded 5-nearest query, and the
+per-place scalar haversine loop /turf_near_me used to run.
+
+    python -m benchmarks.turf_index_bench --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.routers.comparisons import calculate_distance
+from app.turf_index import TurfIndex
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for lat, lon in queries:
+        fn(lat, lon)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main(args):
+    rng = np.random.default_rng(42)
+    for size in args.sizes:
+        lats = rng.uniform(8.0, 30.0, size)
+        lons = rng.uniform(70.0, 90.0, size)
+        start = time.perf_counter()
+        index = TurfIndex(lats, lons, [f'turf {i}' for i in range(size)], [f'uri {i}' for i in range(size)])
+        build = time.perf_counter() - start
+        queries = list(zip(rng.uniform(8.0, 30.0, args.queries), rng.uniform(70.0, 90.0, args.queries)))
+        points = list(zip(lats.tolist(), lons.tolist()))
+
+        def scalar(lat, lon):
+            distances = [calculate_distance(lat, lon, p_lat, p_lon) for p_lat, p_lon in points]
+            return sorted(d for d in distances if d <= 2.5)[:5]
+
+        radius = timed(lambda lat, lon: index.query(lat, lon, k=5, radius_km=2.5), queries)
+        knn = timed(lambda lat, lon: index.query(lat, lon, k=5), queries)
+        slow = timed(scalar, queries[:max(1, args.queries // 20)])
+        print(f"{size:>8} turfs  build {build * 1000:8.1f} ms  radius {radius * 1e6:9.1f} us  "
+              f"knn {knn * 1e6:10.1f} us  scalar {slow * 1e6:12.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    main(parser.parse_args())